@@ -0,0 +1,223 @@
+"""Loads team folders, each into its own module namespace.
+
+Team code imports its helper modules by their plain names (import astar), so
+the modules of two teams that both ship an astar.py would replace each other
+in sys.modules. While a team is imported, its folder is put first on sys.path
+and any module already loaded under the name of one of the team's files is
+moved aside. Afterwards the team's modules are registered under
+"_agent_teams.<folder>_<version>.<name>" instead and the moved modules are put
+back, so the next team gets its own copies. Whenever the engine calls into the
+Agent class (construction, update, terminate), the team's folder and modules
+are made importable by their plain names again, so imports inside functions
+find the team's own modules.
+
+Every load runs the team's modules afresh, like a separate process would, so
+module-level state never carries over from one match to the next. What is
+cached is the work that does not depend on the match: the version hash per
+folder, and the compiled code of each of the team's source files per folder and
+version. A later load stats the team's files, hashes their contents only when
+one of them changed, and then executes the cached code into new module objects
+instead of reading and compiling the sources again.
+"""
+
+import os
+import re
+import sys
+import hashlib
+import functools
+import importlib
+import importlib.abc
+import importlib.util
+import importlib.machinery
+
+PACKAGE = "_agent_teams"
+
+_versions = {} # absolute folder -> (stat signature, version)
+_finders = {} # absolute folder -> _TeamFinder for its current version
+
+def _source_files(folder):
+    """Returns the paths of every .py file in a team folder and its subfolders, sorted."""
+    paths = []
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+        paths.extend(os.path.join(root, name) for name in sorted(files) if name.endswith(".py"))
+    return paths
+
+def _signature(folder):
+    signature = []
+    for path in _source_files(folder):
+        stat = os.stat(path)
+        signature.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+def team_version(folder):
+    """Returns a short hash of the .py files in a team folder, to tell versions of a team apart."""
+    digest = hashlib.sha1()
+    for path in _source_files(folder):
+        digest.update(os.path.relpath(path, folder).encode())
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+def _top_level_names(folder):
+    """Returns the names the team's own modules and packages are imported by."""
+    names = set()
+    for entry in os.listdir(folder):
+        path = os.path.join(folder, entry)
+        if entry.endswith(".py"):
+            names.add(entry[:-3])
+        elif os.path.isfile(os.path.join(path, "__init__.py")):
+            names.add(entry)
+    return names
+
+class _CachedCodeLoader(importlib.abc.Loader):
+    """Executes a team's source file from its compiled code, compiling it only the first time."""
+
+    def __init__(self, path, code):
+        self.path = path
+        self.code = code # Source path -> code object, shared by the loads of one team version
+
+    def create_module(self, spec):
+        return None
+
+    def exec_module(self, module):
+        code = self.code.get(self.path)
+        if code is None:
+            with open(self.path, "rb") as file:
+                code = self.code[self.path] = compile(file.read(), self.path, "exec", dont_inherit=True)
+        exec(code, module.__dict__)
+
+class _TeamFinder(importlib.abc.MetaPathFinder):
+    """Finds one version of a team's modules in its folder and loads them through _CachedCodeLoader.
+
+    Where each module was found is remembered along with its code, so later
+    loads of the same version neither search the folder nor compile again.
+    """
+
+    def __init__(self, folder, version):
+        self.folder = folder
+        self.version = version
+        self.names = _top_level_names(folder)
+        self.has_packages = any(os.path.isdir(os.path.join(folder, name)) for name in self.names)
+        self.code = {}
+        self.found = {} # Module name -> (source path, submodule search locations)
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname.split(".")[0] not in self.names:
+            return None
+        found = self.found.get(fullname)
+        if found is None:
+            spec = importlib.machinery.PathFinder.find_spec(fullname, path or [self.folder])
+            if spec is None or not isinstance(spec.loader, importlib.machinery.SourceFileLoader):
+                return spec
+            found = self.found[fullname] = (spec.origin, spec.submodule_search_locations)
+        origin, locations = found
+        return importlib.util.spec_from_file_location(
+            fullname, origin, loader=_CachedCodeLoader(origin, self.code), submodule_search_locations=locations)
+
+class _TeamImports:
+    """Makes a loaded team's folder and modules importable by their plain names while its code runs."""
+
+    def __init__(self, finder, modules):
+        self.finder = finder
+        self.folder = finder.folder
+        self.names = finder.names # Top-level names of the team's files
+        self.modules = modules # Plain name -> module, as imported by the team
+        self.has_packages = finder.has_packages
+        self.depth = 0
+        self.moved_aside = None
+
+    def _is_team_module(self, name):
+        return name.split(".")[0] in self.names
+
+    def __enter__(self):
+        self.depth += 1
+        if self.depth > 1:
+            return
+        if not self.has_packages:
+            # Only the team's file names and the modules it imported can clash
+            clashing = [name for name in self.names.union(self.modules) if name in sys.modules]
+        else:
+            clashing = [name for name in sys.modules if self._is_team_module(name)]
+        self.moved_aside = {name: sys.modules.pop(name) for name in clashing}
+        sys.modules.update(self.modules)
+        sys.path.insert(0, self.folder)
+        sys.meta_path.insert(0, self.finder)
+        self.module_count = len(sys.modules)
+
+    def __exit__(self, *exc_info):
+        self.depth -= 1
+        if self.depth:
+            return
+        sys.meta_path.remove(self.finder)
+        sys.path.remove(self.folder)
+        # Keep the team's modules imported while it ran for its next calls
+        if len(sys.modules) != self.module_count:
+            if self.has_packages:
+                imported = [name for name in sys.modules if self._is_team_module(name)]
+            else:
+                imported = [name for name in self.names if name in sys.modules]
+            self.modules.update((name, sys.modules[name]) for name in imported)
+        for name in self.modules:
+            sys.modules.pop(name, None)
+        sys.modules.update(self.moved_aside)
+        self.moved_aside = None
+
+
+def _in_team_imports(method, team_imports):
+    @functools.wraps(method)
+    def call(*args, **kwargs):
+        with team_imports:
+            return method(*args, **kwargs)
+    return call
+
+def _import_team(folder, version):
+    finder = _finders.get(folder)
+    if finder is None or finder.version != version:
+        finder = _finders[folder] = _TeamFinder(folder, version)
+    team_imports = _TeamImports(finder, {})
+    with team_imports:
+        agent_module = importlib.import_module("agent")
+    team_modules = team_imports.modules
+
+    team_name = re.sub(r"\W", "_", os.path.basename(folder))
+    namespace = f"{PACKAGE}.{team_name}_{version}"
+    for name, module in team_modules.items():
+        sys.modules[f"{namespace}.{name}"] = module
+
+    # The engine's calls into the agent run with the team's imports in place
+    agent_class = agent_module.Agent
+    methods = {name: _in_team_imports(getattr(agent_class, name), team_imports)
+               for name in ("__init__", "update", "terminate") if hasattr(agent_class, name)}
+    methods.update(__module__=agent_class.__module__, __qualname__=agent_class.__qualname__)
+    return type(agent_class.__name__, (agent_class,), methods), team_modules
+
+def check_team_folder(folder_path):
+    """Raises FileNotFoundError unless folder_path is a folder with an 'agent.py' file."""
+    if not os.path.isdir(folder_path):
+        raise FileNotFoundError(f"Agent folder not found: {folder_path}")
+    if not os.path.isfile(os.path.join(folder_path, "agent.py")):
+        raise FileNotFoundError(f"Required 'agent.py' not found in folder: {folder_path}")
+
+def _load(folder_path):
+    check_team_folder(folder_path)
+    folder = os.path.abspath(folder_path)
+    signature = _signature(folder)
+    cached = _versions.get(folder)
+    if cached and cached[0] == signature:
+        version = cached[1]
+    else:
+        version = team_version(folder)
+        _versions[folder] = (signature, version)
+    return _import_team(folder, version)
+
+def load_agent_class(folder_path):
+    """Returns the Agent class from the 'agent.py' file within a given folder, in freshly run modules."""
+    return _load(folder_path)[0]
+
+def load_team_module(folder_path, name):
+    """Returns one of a team's own modules (e.g. "astar"), freshly run along with its agent.py."""
+    team_modules = _load(folder_path)[1]
+    if name not in team_modules:
+        raise ImportError(f"Module '{name}' is not imported by the agent in {folder_path}")
+    return team_modules[name]
@@ -0,0 +1,114 @@
+"""Captures what agents print instead of writing it to the terminal.
+
+In "capture" mode every agent's stdout goes to an in-memory ring buffer
+keeping its last AGENT_LOG_CAPACITY characters, and a whole match accepts at
+most AGENT_LOG_MATCH_LIMIT characters from all agents together (the rest is
+only counted). Buffers are written out on demand with dump(), and an agent's
+buffer is dumped to stderr automatically when its code raises. In "discard"
+mode output is dropped straight away.
+"""
+
+import sys
+import collections
+from config import *
+
+AGENT_OUTPUT_MODES = ["show", "capture", "discard"]
+
+class DiscardedOutput:
+    """Stands in for stdout and ignores everything written to it."""
+
+    def write(self, text):
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def dump(self, file=None):
+        pass
+
+
+class AgentLog:
+    """Stands in for one agent's stdout, keeping only the most recent output."""
+
+    def __init__(self, capture, label):
+        self.capture = capture
+        self.label = label
+        self.chunks = collections.deque()
+        self.size = 0
+        self.dropped = 0 # Characters overwritten or over the match limit
+
+    def write(self, text):
+        length = len(text)
+        if length > self.capture.remaining:
+            self.dropped += length
+            return length
+        self.capture.remaining -= length
+
+        self.chunks.append(text)
+        self.size += length
+        while self.size > self.capture.capacity:
+            excess = self.size - self.capture.capacity
+            oldest = self.chunks[0]
+            if len(oldest) <= excess:
+                self.chunks.popleft()
+                self.size -= len(oldest)
+                self.dropped += len(oldest)
+            else:
+                self.chunks[0] = oldest[excess:]
+                self.size -= excess
+                self.dropped += excess
+        return length
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return "".join(self.chunks)
+
+    def dump(self, file=None):
+        """Writes the captured output to file (stderr by default) and empties the buffer."""
+        file = file or sys.stderr
+        dropped = f", {self.dropped} earlier characters dropped" if self.dropped else ""
+        file.write(f"--- output of {self.label}{dropped} ---\n")
+        file.write(self.getvalue())
+        self.chunks.clear()
+        self.size = 0
+        self.dropped = 0
+
+
+class AgentLogCapture:
+    """Output capture for all agents of one match."""
+
+    def __init__(self, mode="capture", capacity=AGENT_LOG_CAPACITY, match_limit=AGENT_LOG_MATCH_LIMIT):
+        self.mode = mode
+        self.capacity = capacity
+        self.remaining = match_limit
+        self.logs = {} # (color, index) -> AgentLog
+        self._discarded = DiscardedOutput()
+
+    def output_for(self, color, index):
+        if self.mode == "discard":
+            return self._discarded
+        log = AgentLog(self, f"{color} agent {index}")
+        self.logs[(color, index)] = log
+        return log
+
+    def dump(self, file=None):
+        """Writes out the captured output of every agent that printed something."""
+        for log in self.logs.values():
+            if log.size or log.dropped:
+                log.dump(file)
+
+
+def call_with_output(output, func, *args):
+    """Calls func with sys.stdout redirected to output, dumping the output if func raises."""
+    stdout = sys.stdout
+    sys.stdout = output
+    try:
+        return func(*args)
+    except Exception:
+        sys.stdout = stdout
+        output.dump()
+        raise
+    finally:
+        sys.stdout = stdout
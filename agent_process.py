@@ -0,0 +1,172 @@
+"""Runs a team's agents in a worker process of their own.
+
+The engine talks to the worker over a pipe: every agent update sends the
+visible world as one string plus the agent's state, and the worker answers
+with the action and the CPU time the update took. An update that doesn't
+answer within the team's time budget is played as a no-op, and while the
+worker is still busy with it, further updates of that team are skipped, so a
+slow agent can only stall itself and never the simulation.
+"""
+
+import sys
+import os
+import multiprocessing
+import random
+import time
+from config import *
+
+_NOT_READY = object()
+
+class AgentProcessError(RuntimeError):
+    """Raised when an agent running in a worker process fails."""
+
+
+def _run_worker(conn, team_folder, seed, quiet):
+    if quiet:
+        sys.stdout = open(os.devnull, "w")
+    # Imported here so the worker loads the agent code, not the engine process
+    from agent_loader import load_agent_class
+    try:
+        agent_class = load_agent_class(team_folder)
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+        return
+    conn.send(("ready", None))
+
+    if seed is not None:
+        random.seed(seed)
+    agents = {}
+    shared_knowledge = {}
+
+    while True:
+        message = conn.recv()
+        kind = message[0]
+        if kind == "update":
+            _, request, index, visible, position, can_shoot, holding_flag, hp, ammo = message
+            size = AGENT_VISION_RANGE*2 + 1
+            visible_world = [list(visible[i:i+size]) for i in range(0, len(visible), size)]
+            start = time.process_time()
+            try:
+                action, direction = agents[index].update(visible_world, position, can_shoot, holding_flag, shared_knowledge, hp, ammo)
+            except Exception as e:
+                conn.send(("error", request, f"{type(e).__name__}: {e}", time.process_time() - start))
+            else:
+                conn.send(("action", request, (action, direction), time.process_time() - start))
+        elif kind == "create":
+            _, color, index = message
+            agents[index] = agent_class(color, index)
+        elif kind == "terminate":
+            _, index, reason = message
+            agents.pop(index).terminate(reason)
+        elif kind == "close":
+            break
+    conn.close()
+
+
+class AgentProcessTeam:
+    """One team's agents, running in a worker process. Pass create_agent as the World's agent class."""
+
+    def __init__(self, team_folder, time_budget=AGENT_TIME_BUDGET, seed=None, quiet=False):
+        self.team_folder = team_folder
+        self.time_budget = time_budget
+
+        self.conn, worker_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_run_worker, args=(worker_conn, team_folder, seed, quiet), daemon=True)
+        self.process.start()
+        worker_conn.close()
+
+        # Loading the agent code doesn't count against the time budget
+        try:
+            kind, error = self.conn.recv()
+        except EOFError:
+            kind, error = "error", f"process exited (exit code {self.process.exitcode})"
+        if kind == "error":
+            self.close()
+            raise AgentProcessError(f"Error loading agent from {team_folder}: {error}")
+
+        self.last_request = 0
+        self.pending = None # Request the worker is still working on
+        self.updates = 0
+        self.timeouts = 0 # Updates that ran out of time
+        self.skipped = 0 # Updates not sent because the worker was still busy
+        self.cpu_time = 0.0
+        self.max_cpu_time = 0.0
+
+    def create_agent(self, color, index):
+        self.conn.send(("create", color, index))
+        return RemoteAgent(self, color, index)
+
+    def update(self, index, visible_world, position, can_shoot, holding_flag, hp, ammo):
+        if self.pending is not None and self._collect(0) is _NOT_READY:
+            self.skipped += 1
+            return "", None
+
+        self.last_request += 1
+        self.pending = self.last_request
+        visible = "".join("".join(row) for row in visible_world)
+        self.conn.send(("update", self.pending, index, visible, position, can_shoot, bool(holding_flag), hp, ammo))
+        self.updates += 1
+
+        reply = self._collect(self.time_budget)
+        if reply is _NOT_READY:
+            self.timeouts += 1
+            return "", None
+        return reply
+
+    def _collect(self, timeout):
+        """Waits up to timeout seconds for the reply to the pending request."""
+        try:
+            if not self.conn.poll(timeout):
+                return _NOT_READY
+            kind, request, result, cpu_time = self.conn.recv()
+        except EOFError:
+            raise AgentProcessError(f"Agent process for {self.team_folder} exited (exit code {self.process.exitcode})")
+
+        self.pending = None
+        self.cpu_time += cpu_time
+        self.max_cpu_time = max(self.max_cpu_time, cpu_time)
+        if kind == "error":
+            raise AgentProcessError(f"Agent from {self.team_folder} failed: {result}")
+        return result
+
+    def terminate(self, index, reason):
+        self.conn.send(("terminate", index, reason))
+
+    def stats(self):
+        return {
+            "updates": self.updates,
+            "timeouts": self.timeouts,
+            "skipped": self.skipped,
+            "cpu_time": self.cpu_time,
+            "max_cpu_time": self.max_cpu_time,
+        }
+
+    def close(self):
+        try:
+            self.conn.send(("close",))
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class RemoteAgent:
+    """Stands in for an Agent living in an AgentProcessTeam's worker.
+
+    The team's shared_knowledge lives in the worker too, so the dictionary
+    passed by the engine is not used.
+    """
+
+    def __init__(self, team, color, index):
+        self.team = team
+        self.color = color
+        self.index = index
+
+    def update(self, visible_world, position, can_shoot, holding_flag, shared_knowledge, hp, ammo):
+        return self.team.update(self.index, visible_world, position, can_shoot, holding_flag, hp, ammo)
+
+    def terminate(self, reason):
+        self.team.terminate(self.index, reason)
@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+from config import *
+
+# ANSI escape sequences
+CLEAR_SCREEN = "\x1b[2J\x1b[H"
+CLEAR_LINE_END = "\x1b[K"
+HIDE_CURSOR = "\x1b[?25l"
+SHOW_CURSOR = "\x1b[?25h"
+MAP_TOP = 4 # Terminal line of the first map row, below the status line, a rule and a blank line
+
+def _move(line, column):
+    return f"\x1b[{line};{column}H"
+
+def status_line(world):
+    """Returns one line with the tick, every agent's HP and ammo and where both flags are."""
+    parts = [f"Tick: {world.tick}"]
+    for color in ("blue", "red"):
+        agents = [f"{agent.index}:{agent.hp}hp/{agent.ammo}" for agent in world.agents if agent.color == color]
+        parts.append(f"{color} " + (" ".join(agents) or "-"))
+    for flag in world.flags:
+        if flag.agent_holding:
+            state = f"taken by {flag.agent_holding.color} {flag.agent_holding.index}"
+        elif flag.position == flag.spawn_position:
+            state = "home"
+        else:
+            state = f"at {flag.position}"
+        parts.append(f"{flag.color} flag {state}")
+    return " | ".join(parts)
+
+
+class AsciiRenderer:
+    """Draws the world in the terminal, rewriting only the characters that changed.
+
+    The first frame clears the screen and draws the whole map, later frames
+    move the cursor to each changed cell with ANSI escape codes and write the
+    new character, so the terminal receives a few bytes per frame instead of
+    the full map. Frames are drawn at most fps times per second however fast
+    the world ticks, and the final state of a match is always drawn.
+    Anything else written to the terminal moves the map, so when agents print
+    as they play, pass full_redraw=True to clear and redraw every frame.
+    """
+
+    def __init__(self, fps=ASCII_FPS, stream=None, status=True, full_redraw=False):
+        self.stream = stream or sys.stdout
+        self.frame_interval = 1 / fps if fps else 0
+        self.status = status
+        self.full_redraw = full_redraw
+        self.next_frame = 0
+        self.terrain = None # Terrain of the world on screen, a new one means a full redraw
+        self.frame = None # Tiles currently on screen, as rows
+        self.status_text = None
+        self.lines = 0
+
+        # Windows terminals only interpret escape codes after this
+        if os.name == "nt":
+            os.system("")
+
+    def render(self, world, force=False):
+        """Draws the world, unless the previous frame was drawn less than 1/fps seconds ago."""
+        now = time.perf_counter()
+        if now < self.next_frame and not (force or world.win):
+            return
+        self.next_frame = now + self.frame_interval
+
+        if self.full_redraw or world.terrain is not self.terrain:
+            out = [HIDE_CURSOR, CLEAR_SCREEN, "\n", "=="*world.width + "=", "\n\n"]
+            out.extend(" " + " ".join(row) + "\n" for row in world.worldmap_buffer)
+            self.terrain = world.terrain
+            self.frame = [row[:] for row in world.worldmap_buffer]
+            self.status_text = None
+            self.lines = MAP_TOP + world.height
+        else:
+            out = []
+            for y, row in enumerate(world.worldmap_buffer):
+                drawn = self.frame[y]
+                if row == drawn:
+                    continue
+                for x, tile in enumerate(row):
+                    if tile != drawn[x]:
+                        out.append(_move(MAP_TOP + y, 2 + 2*x) + tile)
+                        drawn[x] = tile
+
+        text = status_line(world) if self.status else f"Tick: {world.tick}"
+        if text != self.status_text:
+            out.append(_move(1, 1) + text + CLEAR_LINE_END)
+            self.status_text = text
+
+        if out:
+            # Park the cursor below the map, so anything else printed doesn't land in it
+            out.append(_move(self.lines, 1))
+            self.stream.write("".join(out))
+            self.stream.flush()
+
+    def close(self):
+        self.stream.write(SHOW_CURSOR)
+        self.stream.flush()
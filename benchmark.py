@@ -0,0 +1,222 @@
+"""Benchmarks for the engine and agent hot paths.
+
+Every benchmark runs on the same seeded maps, so numbers are comparable
+between runs on one machine. Results are compared with the stored baseline
+(BENCHMARK_BASELINE_FILE) and any benchmark slower than the baseline by more
+than --threshold is flagged as a regression. Baselines are machine-specific:
+record one with --save-baseline on the machine you compare on.
+
+    python benchmark.py                     # compare with the baseline
+    python benchmark.py --save-baseline     # store the current numbers
+    python benchmark.py visible buffer      # only benchmarks whose name contains these
+"""
+
+import sys
+import os
+import argparse
+import json
+import random
+import timeit
+from tournament import World
+from agent_loader import load_team_module
+from config import *
+
+BENCHMARK_BASELINE_FILE = "benchmark_baseline.json"
+MAP_SEEDS = range(10)
+MAP_SIZES = [(HEIGHT, WIDTH), (HEIGHT*2, WIDTH*2), (HEIGHT*4, WIDTH*4)]
+TICKS_PER_RUN = 2000
+
+
+class StubAgent:
+    """Wanders and shoots at random from its own seeded stream, so runs are repeatable."""
+
+    def __init__(self, color, index):
+        self.rng = random.Random(f"{color}{index}")
+
+    def update(self, visible_world, position, can_shoot, holding_flag, shared_knowledge, hp, ammo):
+        action = "shoot" if can_shoot and self.rng.random() < 0.2 else "move"
+        return action, self.rng.choice(["left", "right", "up", "down"])
+
+    def terminate(self, reason):
+        pass
+
+
+def _new_world(seed, height=HEIGHT, width=WIDTH):
+    world = World(height, width, 0, StubAgent, StubAgent, headless=True, seed=seed)
+    world.generate_world()
+    world.buffer_worldmap()
+    return world
+
+def _worlds():
+    return [_new_world(seed) for seed in MAP_SEEDS]
+
+def _time(func, number):
+    """Returns the best time per call in seconds over a few repeats."""
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def bench_ticks(height, width):
+    """Seconds per tick of a whole match loop with stub agents."""
+    ticks = []
+    def run():
+        # Matches may end before TICKS_PER_RUN, count the ticks actually played
+        ticks.clear()
+        for seed in MAP_SEEDS[:3]:
+            world = _new_world(seed, height, width)
+            while not world.win and world.tick < TICKS_PER_RUN:
+                world.step()
+            ticks.append(world.tick)
+    return _time(run, 1) / sum(ticks)
+
+def bench_generate_world():
+    return _time(lambda: [_new_world(seed) for seed in MAP_SEEDS], 3) / len(MAP_SEEDS)
+
+def bench_visible_world():
+    cases = []
+    for world in _worlds():
+        for agent in world.agents:
+            for y in range(1, world.height - 1, 3):
+                for x in range(1, world.width - 1, 3):
+                    if not world.is_wall(x, y):
+                        cases.append((world, agent, (x, y)))
+    def run():
+        for world, agent, position in cases:
+            agent.position = position
+            agent.get_visible_world(world)
+    return _time(run, 3) / len(cases)
+
+def bench_buffer_worldmap():
+    worlds = _worlds()
+    rng = random.Random(0)
+    moves = [[(agent, (rng.randint(1, world.width-2), rng.randint(1, world.height-2))) for agent in world.agents] for world in worlds]
+    def run():
+        # Move every agent so each call has cells to repaint
+        for world, world_moves in zip(worlds, moves):
+            for agent, position in world_moves:
+                agent.position, position = position, agent.position
+            world.buffer_worldmap()
+    return _time(run, 100) / len(worlds)
+
+def bench_update_bullets():
+    worlds = _worlds()
+    rng = random.Random(0)
+    bullets = []
+    for world in worlds:
+        spawns = []
+        for _ in range(50):
+            x, y = rng.randint(1, world.width-2), rng.randint(1, world.height-2)
+            if not world.is_wall(x, y):
+                spawns.append((rng.choice(["blue", "red"]), (x, y), rng.choice([(1, 0), (-1, 0), (0, 1), (0, -1)])))
+        bullets.append(spawns)
+    def run():
+        for world, spawns in zip(worlds, bullets):
+            for color, position, direction in spawns:
+                world.bullets.spawn(color, position, direction)
+            while len(world.bullets):
+                world.update_bullets()
+    return _time(run, 3) / len(worlds)
+
+def bench_astar():
+    astar = load_team_module("my_team", "astar")
+    cases = []
+    for world in _worlds():
+        shared_map = {(x, y): world.worldmap[y][x] for y in range(world.height) for x in range(world.width)}
+        blue_flag, red_flag = world.flags
+        start = (blue_flag.position[0] + 1, blue_flag.position[1])
+        goal = (red_flag.position[0] - 1, red_flag.position[1])
+        cases.append((shared_map, start, goal))
+    return _time(lambda: [astar.astar(shared_map, start, goal, "") for shared_map, start, goal in cases], 1) / len(cases)
+
+def bench_distance_field():
+    distance_field = load_team_module("my_team", "distance_field")
+    cases = []
+    for world in _worlds():
+        # Tiles are learned a few at a time, as agents explore from the blue side
+        shared_map = {(x, y): world.worldmap[y][x] for x in range(world.width) for y in range(world.height)}
+        cases.append((shared_map, list(shared_map), world.flags[1].position))
+    def run():
+        for shared_map, map_log, target in cases:
+            field = distance_field.DistanceField(target, "")
+            for learned in range(0, len(map_log) + 20, 20):
+                field.update(shared_map, map_log[:learned])
+    return _time(run, 3) / len(cases)
+
+def bench_map_memory():
+    map_memory = load_team_module("my_team", "map_memory")
+    cases = []
+    for world in _worlds():
+        agent = world.agents[0]
+        for y in range(1, world.height - 1, 2):
+            for x in range(1, world.width - 1, 2):
+                if not world.is_wall(x, y):
+                    agent.position = (x, y)
+                    cases.append((agent.get_visible_world(world), (x, y)))
+    def run():
+        memory = map_memory.MapMemory("blue")
+        shared_knowledge = {}
+        for visible_world, position in cases:
+            memory.update_map_memory(visible_world, position, shared_knowledge)
+    return _time(run, 3) / len(cases)
+
+BENCHMARKS = {
+    **{f"ticks_{height}x{width}": (lambda height=height, width=width: bench_ticks(height, width)) for height, width in MAP_SIZES},
+    "generate_world": bench_generate_world,
+    "get_visible_world": bench_visible_world,
+    "buffer_worldmap": bench_buffer_worldmap,
+    "update_bullets": bench_update_bullets,
+    "astar": bench_astar,
+    "distance_field": bench_distance_field,
+    "update_map_memory": bench_map_memory,
+}
+
+
+def run_benchmarks(names):
+    results = {}
+    for name in names:
+        results[name] = BENCHMARKS[name]()
+        print(f"{name:<24}{results[name]*1e6:>12.2f} us")
+    return results
+
+def compare(results, baseline, threshold):
+    """Prints every result next to its baseline, returns the names that regressed."""
+    regressions = []
+    print(f"\n{'Benchmark':<24}{'Baseline':>12}{'Now':>12}{'Change':>10}")
+    for name, seconds in results.items():
+        if name not in baseline:
+            continue
+        change = seconds / baseline[name] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<24}{baseline[name]*1e6:>10.2f}us{seconds*1e6:>10.2f}us{change:>+10.1%}{flag}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the AI Agent Capture the Flag engine")
+    parser.add_argument("filters", nargs="*", help="Only run benchmarks whose name contains one of these")
+    parser.add_argument("--threshold", "-t", type=float, default=0.2, help="Slowdown relative to the baseline that counts as a regression (0.2 = 20%%)")
+    parser.add_argument("--baseline", default=BENCHMARK_BASELINE_FILE, help="Baseline file to compare with or save to")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline")
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if not args.filters or any(f in name for f in args.filters)]
+    results = run_benchmarks(names)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.isfile(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=4, sort_keys=True)
+        print(f"\nSaved baseline to {args.baseline}")
+    elif os.path.isfile(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+    else:
+        print(f"\nNo baseline at {args.baseline}, record one with --save-baseline")
@@ -14,10 +14,36 @@ SHOOT_COOLDOWN = 4 # Ticks an agent must wait before shooting
 AGENT_MAX_HP = 3
 AGENT_MAX_AMMO = 10
 
+# Isolated agent processes (--isolate)
+AGENT_TIME_BUDGET = 0.1 # Seconds an agent update may take before it is skipped
+
+# Stalemate adjudication (on in round_robin.py, --stalemate-window in main.py)
+STALEMATE_WINDOW = 1500 # Ticks without damage, deaths, healing or flag movement before a match is tied
+STALEMATE_CYCLE_REPEATS = 100 # Times the exact same state may come back before a match is tied
+
 # Healing and Resupply
 HEAL_RESUPPLY_RATE = 100 # Ticks between each heal/resupply tick
 HEAL_RESUPPLY_RANGE = 2 # Manhattan distance from flag spawn to heal/resupply
 
+# Captured agent output (--agent-output capture)
+AGENT_LOG_CAPACITY = 16384 # Characters of recent output kept per agent
+AGENT_LOG_MATCH_LIMIT = 1048576 # Characters accepted from all agents in one match
+
+# Match performance reports (--profile), one JSON object per line
+PERFORMANCE_REPORT_FILE = "performance.jsonl"
+
+# Results database (--db)
+RESULTS_DB_FILE = "results.db"
+RESULTS_BATCH_SIZE = 32 # Results queued before they are written in one transaction
+ELO_INITIAL_RATING = 1500
+ELO_K_FACTOR = 16
+
+# Replays
+REPLAY_KEYFRAME_INTERVAL = 250 # Ticks between full state snapshots, for seeking during playback
+
+# ASCII display (--ascii)
+ASCII_FPS = 30 # Frames drawn per second at most, whatever the tick rate
+
 # Tile representations
 ASCII_TILES = {
     "empty": " ",
@@ -0,0 +1,78 @@
+"""Simulating ahead from packed game states, for agents that search.
+
+A game state is the bytes World.snapshot() produces: the tick, the result,
+and every agent, flag and bullet packed with struct, without the map and
+without any Agent instances. pack_state, unpack_state and the GameState
+tuples come from tournament.py and are importable from here too.
+
+ForwardModel keeps a private World on a fixed map, with no agent code
+attached, and its step() restores a state into it, plays one agent update
+with the given actions using the engine's own update_agents, collision and
+update_bullets, and snapshots it again. The caller's states are never
+modified, so a search can branch from any of them.
+
+    model = ForwardModel(rows, flag_blue_pos, flag_red_pos) # the map as the agent knows it
+    state = pack_state(GameState(tick, None, agents, flags, bullets))
+    state = model.step(state, {("blue", 0): ("shoot", "right")})
+    unpack_state(state).agents
+
+Agents without an action stand still. Walls missing from the map an agent
+passes in are simply not there in the simulation.
+"""
+
+from tournament import World, AgentState, FlagState, BulletState, GameState, pack_state, unpack_state, state_win
+from config import *
+
+
+class ForwardModel:
+    """Steps packed game states on one map, with the engine's rules."""
+
+    def __init__(self, worldmap, flag_blue_pos, flag_red_pos):
+        height, width = len(worldmap), len(worldmap[0])
+        self.world = World(height, width, 0, None, None, headless=True, seed=0, skip_idle_ticks=True)
+        self.world.load_map(worldmap, flag_blue_pos, flag_red_pos)
+        self.start = self.world.snapshot()
+
+    @classmethod
+    def from_world(cls, world):
+        """Returns a model of a running world's map, e.g. for tests or agents that are given the full map."""
+        return cls(world.worldmap, *(flag.spawn_position for flag in world.flags))
+
+    def initial_state(self):
+        """Returns the state at the start of a match on this map."""
+        return self.start
+
+    def step(self, state, actions=None):
+        """Returns the state after one agent update with the given actions.
+
+        actions maps (color, index) to (action, direction), like
+        World.update_agents. The bullet movement up to the next agent update is
+        included, and a finished match (win set) is returned unchanged.
+        """
+        world = self.world
+        world.restore(state)
+        if world.win:
+            return state
+
+        # Ticks before the next agent update only move bullets
+        while world.tick % AGENT_UPDATE_INTERVAL:
+            world.step()
+            if world.win:
+                return world.snapshot()
+
+        world.step(actions or {})
+        while world.tick % AGENT_UPDATE_INTERVAL and not world.win:
+            world.step()
+        world.check_win_state()
+        return world.snapshot()
+
+    def rollout(self, state, policy, max_updates=None):
+        """Steps state with the actions policy(state) returns until the match ends or max_updates.
+
+        Returns the final state; unpack_state(state).win holds the result.
+        """
+        updates = 0
+        while not state_win(state) and (max_updates is None or updates < max_updates):
+            state = self.step(state, policy(state))
+            updates += 1
+        return state
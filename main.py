@@ -1,136 +1,98 @@
 import sys
 import argparse
-import importlib
-import os
-import pygame
-from tournament import World
+import json
+from tournament import run_match
+from agent_process import AgentProcessError
+from agent_logs import AGENT_OUTPUT_MODES
+from results_store import ResultsStore
+from agent_loader import team_version, check_team_folder
+import agent_loader
 from config import *
 
-def log_match_result(blue_agent_name, red_agent_name, winner, reason):
-    """Appends the result of a match to results.csv."""
+def log_match_result(blue_agent_name, red_agent_name, winner, reason, report=None):
+    """Appends the result of a match to results.csv, and its performance report (if any) to PERFORMANCE_REPORT_FILE."""
     try:
         with open("results.csv", "a") as f:
             f.write(f"{blue_agent_name},{red_agent_name},{winner},{reason}\n")
+        if report is not None:
+            with open(PERFORMANCE_REPORT_FILE, "a") as f:
+                f.write(json.dumps(report) + "\n")
     except IOError as e:
         print(f"Error writing to log file: {e}")
 
-def setup_sprites():
-    """Loads all sprites from files and returns a dictionary mapping tiles to surfaces."""
-    sprites = {
-        ASCII_TILES["wall"]: pygame.image.load("sprites/wall.png").convert_alpha(),
-        ASCII_TILES["blue_agent"]: pygame.image.load("sprites/blue_agent.png").convert_alpha(),
-        ASCII_TILES["red_agent"]: pygame.image.load("sprites/red_agent.png").convert_alpha(),
-        ASCII_TILES["blue_agent_f"]: pygame.image.load("sprites/blue_agent_f.png").convert_alpha(),
-        ASCII_TILES["red_agent_f"]: pygame.image.load("sprites/red_agent_f.png").convert_alpha(),
-        ASCII_TILES["blue_flag"]: pygame.image.load("sprites/blue_flag.png").convert_alpha(),
-        ASCII_TILES["red_flag"]: pygame.image.load("sprites/red_flag.png").convert_alpha(),
-        ASCII_TILES["bullet"]: pygame.image.load("sprites/bullet.png").convert_alpha()
-    }
-    return sprites
-
-def handle_pygame_events():
-    """Handles user input, like closing the window."""
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            return False
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_ESCAPE:
-                return False
-    return True
-
-def render_world(world, screen, sprite_group, sprites):
-    """Draws the current world state to the screen."""
-    sprite_group.empty()
-    for y in range(world.height):
-        for x in range(world.width):
-            tile = world.worldmap_buffer[y][x]
-            if tile in sprites:
-                sprite = pygame.sprite.Sprite()
-                sprite.image = sprites[tile]
-                sprite.rect = sprite.image.get_rect(topleft=(x * 32, y * 32))
-                sprite_group.add(sprite)
-
-    screen.fill((0, 0, 0))
-    sprite_group.draw(screen)
-    pygame.display.flip()
+def time_budget_ms(text):
+    """argparse type of --time-budget: a positive number of milliseconds."""
+    milliseconds = float(text)
+    if not milliseconds > 0:
+        raise argparse.ArgumentTypeError(f"must be a positive number of milliseconds, not {text}")
+    return milliseconds
 
 def load_agent_class(folder_path):
-    """Dynamically loads the Agent class from the 'agent.py' file within a given folder."""
-    if not os.path.isdir(folder_path):
-        raise FileNotFoundError(f"Agent folder not found: {folder_path}")
-    
-    main_agent_file = os.path.join(folder_path, 'agent.py')
-    if not os.path.isfile(main_agent_file):
-        raise FileNotFoundError(f"Required 'agent.py' not found in folder: {folder_path}")
-
-    # Temporarily add folder to Python path to handle local imports within the agent code
-    sys.path.insert(0, os.path.abspath(folder_path))
-    try:
-        # The module name is 'agent' because the file is agent.py
-        agent_module = importlib.import_module('agent')
-        # Ensure the module is fresh if it was loaded before
-        importlib.reload(agent_module) 
-        agent_class = agent_module.Agent
-    finally:
-        # Clean up the path
-        sys.path.pop(0)
-    
-    return agent_class
+    """Loads the Agent class from the 'agent.py' file within a given folder (see agent_loader)."""
+    return agent_loader.load_agent_class(folder_path)
 
 def main(args):
-    # Dynamically import agent classes from folders
+    folders = (args.blue_team_folder, args.red_team_folder)
     try:
-        blue_agent_class = load_agent_class(args.blue_team_folder)
-        red_agent_class = load_agent_class(args.red_team_folder)
+        if args.isolate:
+            # With --isolate each team runs in its own process, the agent code is only imported there
+            for folder in folders:
+                check_team_folder(folder)
+            teams = folders
+        else:
+            teams = [load_agent_class(folder) for folder in folders]
     except (ImportError, AttributeError, FileNotFoundError) as e:
         print(f"Error loading agent: {e}")
         sys.exit(1)
 
-    # Pygame setup for graphical mode
-    if not args.headless:
-        pygame.init()
-        screen = pygame.display.set_mode((WIDTH*32, HEIGHT*32))
-        sprite_group = pygame.sprite.Group()
-        sprites = setup_sprites()
-        running = True
-    
-    # World setup
-    world = World(HEIGHT, WIDTH, TICK_RATE, blue_agent_class, red_agent_class, headless=args.headless, ascii_mode=args.ascii)
-    world.generate_world()
-
-    while not world.win:
-        world.check_win_state()
-        world.buffer_worldmap()
-
-        if world.tick % AGENT_UPDATE_INTERVAL == 0:
-            world.update_agents()
-        if (world.tick + 1) % BULLET_UPDATE_INTERVAL == 0:
-            world.update_bullets()
-            
-        world.iter()
+    try:
+        result = run_match(
+            *teams,
+            args.seed,
+            headless=args.headless,
+            ascii=args.ascii,
+            fps=args.fps,
+            agent_output=args.agent_output,
+            time_budget=args.time_budget / 1000 if args.isolate else None,
+            profile=args.profile,
+            trace_memory=args.trace_memory,
+            record=args.record,
+            maps=args.maps,
+            map_id=args.map_id,
+            stalemate_window=args.stalemate_window,
+            names=folders,
+        )
+    except AgentProcessError as e:
+        print(f"Error running agent: {e}")
+        sys.exit(1)
 
-        if args.ascii:
-            world.ascii_display()
+    if result.agent_logs:
+        result.agent_logs.dump(sys.stdout)
+    if result.team_stats:
+        for color, stats in result.team_stats.items():
+            print(f"{color.capitalize()} team: {stats['updates']} updates, {stats['cpu_time']:.2f}s CPU "
+                  f"(slowest {stats['max_cpu_time']*1000:.1f}ms), {stats['timeouts']} timed out, {stats['skipped']} skipped")
 
-        if not args.headless:
-            render_world(world, screen, sprite_group, sprites)
-            running = handle_pygame_events()
-            if not running:
-                break
-    
-    world.terminate_agents()
-    
-    winner, reason = world.win
-    if winner == "tied":
-        print(f"\nTied! Reason: {reason}\n")
+    if (result.winner, result.reason) == ("tied", "aborted"):
+        # A match stopped early says nothing about the teams, it isn't logged
+        print(f"\nMatch aborted at tick {result.ticks}, no result recorded\n")
+        return
+    if result.winner == "tied":
+        print(f"\nTied! Reason: {result.reason}\n")
     else:
-        print(f"\n{winner.capitalize()} won! Reason: {reason}\n")
-    
-    log_match_result(args.blue_team_folder, args.red_team_folder, winner, reason)
+        print(f"\n{result.winner.capitalize()} won! Reason: {result.reason}\n")
+    print(f"Seed: {result.seed}")
+
+    if result.report:
+        for color, stats in result.report["teams"].items():
+            print(f"{color.capitalize()} team updates: p50 {stats['p50_ms']:.3f}ms, p95 {stats['p95_ms']:.3f}ms, max {stats['max_ms']:.3f}ms over {stats['calls']} calls")
     
-    if not args.headless:
-        pygame.quit()
-        sys.exit()
+    log_match_result(args.blue_team_folder, args.red_team_folder, result.winner, result.reason, result.report)
+    if args.db:
+        store = ResultsStore(args.db)
+        store.record(args.blue_team_folder, args.red_team_folder, result.winner, result.reason, result.seed, result.ticks,
+                     result.timings["match"], team_version(args.blue_team_folder), team_version(args.red_team_folder))
+        store.close()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="AI Agent Capture the Flag Tournament")
@@ -138,5 +100,20 @@ if __name__ == "__main__":
     parser.add_argument("red_team_folder", help="Path to the folder containing the red team's agent.py")
     parser.add_argument("--headless", "-H", action="store_true", help="Run simulation without GUI for faster execution")
     parser.add_argument("--ascii", "-A", action="store_true", help="Display ASCII rendering in the console")
+    parser.add_argument("--fps", type=float, default=ASCII_FPS, help="Frames per second drawn at most by --ascii")
+    parser.add_argument("--seed", "-s", type=int, default=None, help="Seed for map generation and agent randomness")
+    parser.add_argument("--isolate", "-I", action="store_true", help="Run each team's agents in a separate process with a time budget")
+    parser.add_argument("--time-budget", type=time_budget_ms, default=AGENT_TIME_BUDGET*1000, help="Milliseconds an isolated agent update may take before it is skipped")
+    parser.add_argument("--profile", "-P", action="store_true", help=f"Time every agent update and append a report to {PERFORMANCE_REPORT_FILE}")
+    parser.add_argument("--trace-memory", action="store_true", help="Like --profile, also recording allocations with tracemalloc (slow)")
+    parser.add_argument("--agent-output", choices=AGENT_OUTPUT_MODES, default=None,
+                        help="Print agent output as it happens, capture it and print it after the match, or discard it "
+                             "(default: show, or capture with --ascii)")
+    parser.add_argument("--db", metavar="DATABASE", default=None, help=f"Also store the result in this SQLite database (e.g. {RESULTS_DB_FILE})")
+    parser.add_argument("--maps", metavar="CORPUS", default=None, help="Play on a map from a corpus built with map_corpus.py instead of a generated one")
+    parser.add_argument("--map-id", type=int, default=0, help="Id of the corpus map to play on (with --maps)")
+    parser.add_argument("--stalemate-window", type=int, default=None, metavar="TICKS",
+                        help=f"End the match in a tie after this many ticks without progress, or when it keeps repeating itself (e.g. {STALEMATE_WINDOW})")
+    parser.add_argument("--record", "-R", metavar="REPLAY_FILE", default=None, help="Record a replay of the match to this file")
     args = parser.parse_args()
     main(args)
\ No newline at end of file
@@ -0,0 +1,227 @@
+"""Pre-generated maps with precomputed metadata.
+
+A corpus file holds the maps World.generate_world builds for a range of seeds,
+so map id i of a corpus built from base seed s is the map of seed s + i. Each
+map is stored as a fixed-size record (a small header plus one bit per tile),
+which lets a map be read by id without parsing the rest of the file. The
+header of every record holds the map's metadata:
+
+    flag_distance   shortest path between the two flags, in steps
+    wall_density    share of the tiles inside the border that are walls
+    routes          vertex-disjoint paths between the flags (1 means a single
+                    chokepoint decides the map, at most 4)
+
+    python map_corpus.py maps.ctfm --build 5000
+    python map_corpus.py maps.ctfm
+"""
+
+import argparse
+import collections
+import functools
+import random
+import struct
+from tournament import World
+from config import *
+
+MAGIC = b"CTFM"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sBHHI") # magic, version, width, height, number of maps
+_RECORD = struct.Struct("<QhhhhHHB") # seed, blue flag, red flag, flag distance, walls, routes
+_UNREACHABLE = 0xFFFF
+
+METADATA_KEYS = ["flag_distance", "wall_density", "routes"]
+
+def _neighbours(cell, width):
+    return (cell - 1, cell + 1, cell - width, cell + width)
+
+def flag_distance(terrain, width, start, goal):
+    """Returns the length of the shortest path between two positions, or None if there is none."""
+    start = start[1]*width + start[0]
+    goal = goal[1]*width + goal[0]
+    distance = {start: 0}
+    queue = collections.deque([start])
+    while queue:
+        cell = queue.popleft()
+        if cell == goal:
+            return distance[cell]
+        for neighbour in _neighbours(cell, width):
+            if neighbour not in distance and terrain[neighbour] != ord(ASCII_TILES["wall"]):
+                distance[neighbour] = distance[cell] + 1
+                queue.append(neighbour)
+    return None
+
+def route_count(terrain, width, start, goal):
+    """Returns the number of vertex-disjoint paths between two positions (at most 4).
+
+    This is a max flow where every tile except the two ends can carry one path.
+    Each tile is split into an entry and an exit node joined by an edge of
+    capacity 1, and augmenting paths are found with a breadth-first search.
+    """
+    start = start[1]*width + start[0]
+    goal = goal[1]*width + goal[0]
+    wall = ord(ASCII_TILES["wall"])
+
+    # Node 2*cell is the tile's entry, 2*cell + 1 its exit
+    heads, capacity, edges = [], [], collections.defaultdict(list)
+    def add_edge(u, v, c):
+        edges[u].append(len(heads))
+        heads.append(v)
+        capacity.append(c)
+        edges[v].append(len(heads))
+        heads.append(u)
+        capacity.append(0)
+
+    for cell, tile in enumerate(terrain):
+        if tile == wall:
+            continue
+        add_edge(2*cell, 2*cell + 1, 4 if cell in (start, goal) else 1)
+        for neighbour in _neighbours(cell, width):
+            if 0 <= neighbour < len(terrain) and terrain[neighbour] != wall:
+                add_edge(2*cell + 1, 2*neighbour, 1)
+
+    routes = 0
+    source, sink = 2*start + 1, 2*goal
+    while True:
+        via = {source: None}
+        queue = collections.deque([source])
+        while queue and sink not in via:
+            node = queue.popleft()
+            for edge in edges[node]:
+                if capacity[edge] and heads[edge] not in via:
+                    via[heads[edge]] = edge
+                    queue.append(heads[edge])
+        if sink not in via:
+            return routes
+        node = sink
+        while node != source:
+            edge = via[node]
+            capacity[edge] -= 1
+            capacity[edge ^ 1] += 1
+            node = heads[edge ^ 1]
+        routes += 1
+
+def _pack_walls(terrain):
+    wall = ord(ASCII_TILES["wall"])
+    bits = "".join("1" if tile == wall else "0" for tile in terrain)
+    bits += "0" * (-len(bits) % 8)
+    return int(bits, 2).to_bytes((len(bits) + 7) // 8, "big")
+
+def _unpack_walls(data, cells):
+    bits = format(int.from_bytes(data, "big"), f"0{len(data)*8}b")[:cells]
+    return bits.translate(str.maketrans("01", ASCII_TILES["empty"] + ASCII_TILES["wall"]))
+
+def build_corpus(path, count, base_seed=0, height=HEIGHT, width=WIDTH, progress=None):
+    """Generates the maps of seeds base_seed .. base_seed+count-1 and writes them to path."""
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, width, height, count))
+        for map_id in range(count):
+            seed = base_seed + map_id
+            world = World(height, width, 0, None, None, headless=True, seed=seed)
+            world.generate_world()
+            blue_flag, red_flag = (flag.spawn_position for flag in world.flags)
+
+            distance = flag_distance(world.terrain, width, blue_flag, red_flag)
+            walls = world.terrain.count(ord(ASCII_TILES["wall"])) - 2*(width + height - 2)
+            routes = route_count(world.terrain, width, blue_flag, red_flag) if distance is not None else 0
+            f.write(_RECORD.pack(seed, *blue_flag, *red_flag, _UNREACHABLE if distance is None else distance, walls, routes))
+            f.write(_pack_walls(world.terrain))
+
+            if progress and (map_id + 1) % progress == 0:
+                print(f"{map_id + 1}/{count} maps")
+
+
+class MapCorpus:
+    """Reads a corpus file. Maps are decoded only when they are loaded."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.data = f.read()
+        magic, version, self.width, self.height, self.count = _HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise ValueError(f"Not a map corpus: {path}")
+        if version != VERSION:
+            raise ValueError(f"Unsupported map corpus version {version}")
+        self.cells = self.width * self.height
+        self.record_size = _RECORD.size + (self.cells + 7) // 8
+        self._index = None
+
+    def __len__(self):
+        return self.count
+
+    def _record(self, map_id):
+        if not 0 <= map_id < self.count:
+            raise IndexError(f"Map id {map_id} is not in the corpus (0-{self.count - 1})")
+        offset = _HEADER.size + map_id * self.record_size
+        return _RECORD.unpack_from(self.data, offset), offset + _RECORD.size
+
+    def metadata(self, map_id):
+        """Returns the seed, flag positions and metadata of a map as a dict."""
+        (seed, bx, by, rx, ry, distance, walls, routes), _ = self._record(map_id)
+        return {
+            "id": map_id,
+            "seed": seed,
+            "flags": ((bx, by), (rx, ry)),
+            "flag_distance": None if distance == _UNREACHABLE else distance,
+            "wall_density": walls / ((self.width - 2) * (self.height - 2)),
+            "routes": routes,
+        }
+
+    def index(self):
+        """Returns the metadata of every map, read once and kept."""
+        if self._index is None:
+            self._index = [self.metadata(map_id) for map_id in range(self.count)]
+        return self._index
+
+    def load(self, map_id):
+        """Returns (rows, blue flag position, red flag position), the arguments of World.load_map."""
+        (_, bx, by, rx, ry, *_), offset = self._record(map_id)
+        tiles = _unpack_walls(self.data[offset:offset + self.record_size - _RECORD.size], self.cells)
+        rows = [tiles[y*self.width:(y+1)*self.width] for y in range(self.height)]
+        return rows, (bx, by), (rx, ry)
+
+    def sample(self, count, seed=0, key="flag_distance", strata=4):
+        """Returns count map ids spread evenly over strata equal-sized bands of a metadata key.
+
+        Maps are sorted by key and cut into bands, and the picks are dealt out
+        to the bands in turn, so short and long (or open and cramped) maps are
+        equally represented. Ids repeat only when count exceeds the corpus.
+        """
+        rng = random.Random(seed)
+        ordered = sorted(range(self.count), key=lambda map_id: (self.index()[map_id][key] is None, self.index()[map_id][key] or 0))
+        strata = max(1, min(strata, self.count))
+        bands = [ordered[i*self.count//strata:(i+1)*self.count//strata] for i in range(strata)]
+        for band in bands:
+            rng.shuffle(band)
+
+        picks = []
+        position = [0] * strata
+        for i in range(count):
+            band = i % strata
+            picks.append(bands[band][position[band] % len(bands[band])])
+            position[band] += 1
+        return picks
+
+@functools.lru_cache(maxsize=4)
+def open_corpus(path):
+    """Returns the MapCorpus of a file, reading each file only once per process."""
+    return MapCorpus(path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or summarize a corpus of pre-generated maps")
+    parser.add_argument("corpus", help="Corpus file")
+    parser.add_argument("--build", metavar="COUNT", type=int, default=None, help="Generate this many maps into the corpus file, overwriting it")
+    parser.add_argument("--base-seed", type=int, default=0, help="Seed of map id 0 when building")
+    args = parser.parse_args()
+
+    if args.build is not None:
+        build_corpus(args.corpus, args.build, args.base_seed, progress=1000)
+
+    corpus = MapCorpus(args.corpus)
+    index = corpus.index()
+    print(f"{len(corpus)} maps of {corpus.width}x{corpus.height}")
+    for key in METADATA_KEYS:
+        values = sorted(entry[key] for entry in index if entry[key] is not None)
+        if values:
+            quartiles = ", ".join(f"{values[len(values)*q//4]:.3g}" for q in range(1, 4))
+            print(f"{key:<14} min {values[0]:.3g}, quartiles {quartiles}, max {values[-1]:.3g}")
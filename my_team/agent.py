@@ -13,8 +13,34 @@ This is a universal agent that works for both blue and red teams.
 from config import *
 import random
 import math
+import functools
 from map_memory import MapMemory
 import astar
+from distance_field import distance_field
+
+
+DEPENDENCY_PENALTY = 2.5
+
+
+@functools.lru_cache(maxsize=None)
+def weight_tables(direction_priority, center_priority, towards_right, max_x):
+    """Returns the destination weight factors per column and per row, plain and for tiles out of sight.
+
+    A destination at (x, y) weighs columns[x] * rows[y], since the direction
+    and centre weights are independent of each other.
+    """
+    columns = [
+        direction_priority ** (x if towards_right else max_x - x) for x in range(WIDTH)
+    ]
+    # Closer to the middle row (HEIGHT / 2) = higher score
+    rows = [center_priority ** ((HEIGHT / 2) - abs(y - (HEIGHT / 2))) for y in range(HEIGHT)]
+    exponent = 1 / DEPENDENCY_PENALTY
+    return (
+        columns,
+        rows,
+        [weight**exponent for weight in columns],
+        [weight**exponent for weight in rows],
+    )
 
 
 class Agent:
@@ -120,15 +146,15 @@ class Agent:
         if self.holding_flag:
             print(f"Agent {self.color} {self.index} is holding the flag.")
             # flag collider not mentioned since we need to the flags location
-            path = astar.astar(
-                shared_knowledge["map"], position, self.base_position, ""
-            )
-            if path and len(path) > 1:
-                self.current_path = path[1:]  # exclude current position
-                next_step = self.current_path.pop(0)
-                print("position:", position)
-                print("next step:", next_step)
-                return self.determine_direction(position, next_step)
+            if self.base_position is not None:
+                next_step = distance_field(
+                    shared_knowledge, self.base_position, ""
+                ).next_step(position)
+                if next_step:
+                    self.current_path = []
+                    print("position:", position)
+                    print("next step:", next_step)
+                    return self.determine_direction(position, next_step)
 
         # --- ENEMY FLAG OVERRIDE ---
         if not self.holding_flag:
@@ -145,25 +171,16 @@ class Agent:
                     print(f"Agent {self.color} {self.index} waiting at flag position.")
                     return None, None
 
-                # Check if we are already targeting the flag
-                target_is_flag = False
-                if self.current_path and len(self.current_path) > 0:
-                    if self.current_path[-1] == self.enemy_flag_pos:
-                        target_is_flag = True
-
-                # If not targeting flag (or no path), try to route to it
-                if not target_is_flag:
+                # Route to it along the team's distance field, once the known map connects us
+                next_step = distance_field(
+                    shared_knowledge, self.enemy_flag_pos, ""
+                ).next_step(position)
+                if next_step:
                     print(
                         f"Agent {self.color} {self.index} targeting enemy flag at {self.enemy_flag_pos}"
                     )
-                    path = astar.astar(
-                        shared_knowledge["map"], position, self.enemy_flag_pos, ""
-                    )
-
-                    if path and len(path) > 1:
-                        self.current_path = path[1:]  # discard current position
-                        next_step = self.current_path.pop(0)
-                        return self.determine_direction(position, next_step)
+                    self.current_path = []
+                    return self.determine_direction(position, next_step)
 
         if self.current_path:
             print(
@@ -178,8 +195,8 @@ class Agent:
                 )
                 print(f"Agent {self.color} {self.index} picking destination: {target}")
                 if target:
-                    path = astar.astar(
-                        shared_knowledge["map"],
+                    path = astar.cached_astar(
+                        shared_knowledge,
                         position,
                         target,
                         "{" if self.color == "blue" else "}",
@@ -207,30 +224,22 @@ class Agent:
         current_position: tuple[int, int],
         agent_visible_world: list[list[str]] = None,
     ):
-        visited_tiles = self.mapMemory.get_visited_tiles(shared_knowledge)
-
-        visible_tiles_set = set()
-        if agent_visible_world:
-            ax, ay = current_position
-            vr = len(agent_visible_world) // 2
-            for dy in range(len(agent_visible_world)):
-                for dx in range(len(agent_visible_world[0])):
-                    world_x = ax + (dx - vr)
-                    world_y = ay + (dy - vr)
-                    visible_tiles_set.add((world_x, world_y))
-
+        own_flag = (
+            ASCII_TILES["blue_flag"] if self.color == "blue" else ASCII_TILES["red_flag"]
+        )
+        # Explore the edge of the known map, only once it is all known pick any unvisited tile
         candidates = [
             pos
-            for pos, char in visible_world.items()
-            if pos not in visited_tiles
-            and char
-            not in "#/"
-            + (
-                ASCII_TILES["blue_flag"]
-                if self.color == "blue"
-                else ASCII_TILES["red_flag"]
-            )
+            for pos in self.mapMemory.get_frontier(shared_knowledge)
+            if visible_world[pos] != own_flag
         ]
+        if not candidates:
+            visited_tiles = self.mapMemory.get_visited_tiles(shared_knowledge)
+            candidates = [
+                pos
+                for pos, char in visible_world.items()
+                if pos not in visited_tiles and char not in "#/" + own_flag
+            ]
 
         # Calculate progress towards enemy side (0 to 1)
         x_current = current_position[0]
@@ -263,31 +272,25 @@ class Agent:
         center_priority = CENTER_PRIORITY_INITIAL - (CENTER_PRIORITY_DECAY * progress)
         weights = []
         if candidates:
-            max_x = max(pos[0] for pos in candidates)
+            # Direction is primary (x), center is secondary (y):
+            # blue attacking or red returning -> go right (increase x),
+            # red attacking or blue returning -> go left (decrease x)
+            towards_right = self.color == "blue" or (
+                self.holding_flag and self.color == "red"
+            )
+            max_x = 0 if towards_right else max(pos[0] for pos in candidates)
+            columns, rows, far_columns, far_rows = weight_tables(
+                direction_priority, center_priority, towards_right, max_x
+            )
 
+            # Tiles outside the agent's current view count for less
+            ax, ay = current_position
+            vr = len(agent_visible_world) // 2 if agent_visible_world else -1
             for x, y in candidates:
-                # 1. Direction Weight (X-axis)
-                if self.color == "blue" or (self.holding_flag and self.color == "red"):
-                    # Blue attacking or Red returning -> Go Right (increase x)
-                    x_score = x
+                if abs(x - ax) <= vr and abs(y - ay) <= vr:
+                    weights.append(columns[x] * rows[y])
                 else:
-                    # Red attacking or Blue returning -> Go Left (decrease x)
-                    x_score = max_x - x
-
-                # 2. Center Weight (Y-axis)
-                # Calculate distance from the middle row (HEIGHT / 2)
-                # Closer to middle = higher score
-                dist_from_center = abs(y - (HEIGHT / 2))
-                y_score = (HEIGHT / 2) - dist_from_center
-
-                # Combine weights: Direction is primary, Center is secondary
-                weight = (direction_priority**x_score) * (center_priority**y_score)
-
-                DEPENDENCY_PENALTY = 2.5
-                if (x, y) not in visible_tiles_set:
-                    weight **= (1/DEPENDENCY_PENALTY)
-
-                weights.append(weight)
+                    weights.append(far_columns[x] * far_rows[y])
 
         if candidates and weights:
             selected_coord = random.choices(candidates, weights=weights, k=1)[0]
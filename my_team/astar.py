@@ -1,16 +1,7 @@
-class Node:
-    """A node class for A* Pathfinding"""
+import heapq
+from config import WIDTH, HEIGHT
 
-    def __init__(self, parent=None, position=None):
-        self.parent = parent
-        self.position = position
-
-        self.g = 0
-        self.h = 0
-        self.f = 0
-
-    def __eq__(self, other):
-        return self.position == other.position
+PATH_CACHE_LIMIT = 4096 # Cached start positions before the cache is emptied
 
 
 def astar(
@@ -20,74 +11,103 @@ def astar(
     flag_collider: str,
 ) -> list[tuple[int, int]]:
     """Returns a list of tuples as a path from the given start to the given end in the given maze"""
+    blocked = "#/" + flag_collider
+    start = current_position[1] * WIDTH + current_position[0]
+    target = target_position[1] * WIDTH + target_position[0]
+    target_x, target_y = target_position
 
-    # Create start and end node
-    start_node = Node(None, current_position)
-    start_node.g = start_node.h = start_node.f = 0
-    end_node = Node(None, target_position)
-    end_node.g = end_node.h = end_node.f = 0
+    # Tiles are numbered y * WIDTH + x, g scores and parents live in flat lists
+    g_scores = [-1] * (WIDTH * HEIGHT)
+    parents = [-1] * (WIDTH * HEIGHT)
+    g_scores[start] = 0
+    closed = bytearray(WIDTH * HEIGHT)
 
-    # Initialize both open and closed list - use dict/set for O(1) lookup
-    open_dict = {current_position: start_node}  # position -> node mapping
-    closed_set = set()  # just positions
+    # Manhattan distance never overestimates on a 4-connected grid, so the path is a shortest one
+    h = abs(current_position[0] - target_x) + abs(current_position[1] - target_y)
+    open_heap = [(h, h, start)]
 
     max_iterations = 10000  # Safety limit
     iterations = 0
 
-    while open_dict and iterations < max_iterations:
+    while open_heap and iterations < max_iterations:
+        _, _, current = heapq.heappop(open_heap)
+        if closed[current]:
+            continue  # Stale entry, the tile was reached more cheaply since
+        closed[current] = 1
         iterations += 1
 
-        # Get the current node with lowest f value
-        current_node = min(open_dict.values(), key=lambda node: node.f)
-        current_position = current_node.position
-
-        # Pop current off open dict, add to closed set
-        del open_dict[current_position]
-        closed_set.add(current_position)
-
         # Found the goal
-        if current_position == target_position:
+        if current == target:
             path = []
-            current = current_node
-            while current is not None:
-                path.append(current.position)
-                current = current.parent
+            while current != -1:
+                path.append((current % WIDTH, current // WIDTH))
+                current = parents[current]
             return path[::-1]  # Return reversed path
 
-        # Generate children
-        for new_position in [(0, -1), (0, 1), (-1, 0), (1, 0)]:
-            node_position = (
-                current_position[0] + new_position[0],
-                current_position[1] + new_position[1],
-            )
-
+        x, y = current % WIDTH, current // WIDTH
+        g = g_scores[current] + 1
+        for node_x, node_y in ((x, y - 1), (x, y + 1), (x - 1, y), (x + 1, y)):
             # Make sure within range and walkable
-            if node_position not in shared_map:
-                continue
-            if shared_map[node_position] in "#/" + flag_collider:
+            tile = shared_map.get((node_x, node_y))
+            if tile is None or tile in blocked:
                 continue
-
-            # Skip if already in closed set
-            if node_position in closed_set:
+            node = node_y * WIDTH + node_x
+            if closed[node] or 0 <= g_scores[node] <= g:
                 continue
 
-            # Calculate scores
-            g = current_node.g + 1
-            h = ((node_position[0] - target_position[0]) ** 2) + (
-                (node_position[1] - target_position[1]) ** 2
-            )
-            f = g + h
-
-            # If in open list with better score, skip
-            if node_position in open_dict:
-                if g >= open_dict[node_position].g:
-                    continue
-
-            # Create and add new node
-            new_node = Node(current_node, node_position)
-            new_node.g = g
-            new_node.h = h
-            new_node.f = f
-            open_dict[node_position] = new_node
+            g_scores[node] = g
+            parents[node] = current
+            h = abs(node_x - target_x) + abs(node_y - target_y)
+            heapq.heappush(open_heap, (g + h, h, node))
 
     return None  # No path found
+
+
+def cached_astar(
+    shared_knowledge: dict,
+    current_position: tuple[int, int],
+    target_position: tuple[int, int],
+    flag_collider: str,
+) -> list[tuple[int, int]]:
+    """Like astar over shared_knowledge["map"], reusing paths the team already computed.
+
+    Every position along a computed path is cached with the rest of the path,
+    so an agent walking a route (or a teammate joining it) gets its path
+    without searching. A cached path is dropped once the map gains a tile on or
+    next to it, since that tile might open a shortcut; "map_log" (kept by
+    MapMemory) lists the tiles in the order they were learned and its length
+    is the map's version.
+    """
+    shared_map = shared_knowledge["map"]
+    map_log = shared_knowledge.setdefault("map_log", [])
+    cache = shared_knowledge.setdefault("path_cache", {})
+    version = len(map_log)
+    key = (current_position, target_position, flag_collider)
+
+    entry = cache.get(key)
+    if entry is not None:
+        route, offset = entry
+        if route["version"] != version:
+            if route["path"] is None or any(tile in route["area"] for tile in map_log[route["version"]:]):
+                route = None
+            else:
+                route["version"] = version
+        if route is not None:
+            return route["path"][offset:] if route["path"] else None
+
+    path = astar(shared_map, current_position, target_position, flag_collider)
+
+    if len(cache) > PATH_CACHE_LIMIT:
+        cache.clear()
+    if path is None:
+        # A failed search is only reused until the map changes at all
+        cache[key] = ({"path": None, "version": version, "area": None}, 0)
+        return None
+
+    area = set(path)
+    for x, y in path:
+        area.update(((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)))
+    route = {"path": path, "version": version, "area": area}
+    for offset, position in enumerate(path):
+        cache[(position, target_position, flag_collider)] = (route, offset)
+    return path
@@ -0,0 +1,110 @@
+import heapq
+from config import WIDTH, HEIGHT
+
+
+class DistanceField:
+    """Walking distances from every known tile to one target, over shared_knowledge["map"].
+
+    The field is rooted at the target, so any agent anywhere reads its distance
+    and next step in O(1), however far it moved since the last update. Tiles
+    are only ever added to the shared map, which can only make distances
+    shorter, so update() starts from the tiles appended to "map_log" (kept by
+    MapMemory) since the last update and only relaxes the tiles whose distance
+    drops, instead of searching the whole map again.
+    """
+
+    def __init__(self, target_position: tuple[int, int], flag_collider: str):
+        self.target = target_position[1] * WIDTH + target_position[0]
+        self.blocked = "#/" + flag_collider
+        # Tiles are numbered y * WIDTH + x, -1 is not (yet) reachable
+        self.distances = [-1] * (WIDTH * HEIGHT)
+        self.walkable = bytearray(WIDTH * HEIGHT)
+        self.version = 0  # Length of map_log already taken into account
+
+    def _neighbors(self, tile: int):
+        x, y = tile % WIDTH, tile // WIDTH
+        if y > 0:
+            yield tile - WIDTH
+        if y < HEIGHT - 1:
+            yield tile + WIDTH
+        if x > 0:
+            yield tile - 1
+        if x < WIDTH - 1:
+            yield tile + 1
+
+    def update(self, shared_map: dict[tuple[int, int], str], map_log: list[tuple[int, int]]):
+        """Takes the tiles learned since the last update into account."""
+        if self.version == len(map_log):
+            return
+        new_tiles = map_log[self.version:]
+        self.version = len(map_log)
+
+        distances = self.distances
+        walkable = self.walkable
+        heap = []
+        for x, y in new_tiles:
+            if shared_map[(x, y)] in self.blocked:
+                continue
+            tile = y * WIDTH + x
+            walkable[tile] = 1
+            if tile == self.target:
+                distances[tile] = 0
+                heap.append((0, tile))
+
+        # New tiles next to reachable ones become reachable themselves, and
+        # whatever they connect to may get closer
+        for x, y in new_tiles:
+            tile = y * WIDTH + x
+            if not walkable[tile] or tile == self.target:
+                continue
+            for node in self._neighbors(tile):
+                if distances[node] >= 0 and (distances[tile] < 0 or distances[node] + 1 < distances[tile]):
+                    distances[tile] = distances[node] + 1
+            if distances[tile] >= 0:
+                heap.append((distances[tile], tile))
+
+        heapq.heapify(heap)
+        while heap:
+            distance, tile = heapq.heappop(heap)
+            if distance > distances[tile]:
+                continue  # Stale entry, the tile got closer since
+            distance += 1
+            for node in self._neighbors(tile):
+                if walkable[node] and (distances[node] < 0 or distance < distances[node]):
+                    distances[node] = distance
+                    heapq.heappush(heap, (distance, node))
+
+    def distance(self, position: tuple[int, int]) -> int:
+        """Returns the number of steps from position to the target, or None if no known route."""
+        distance = self.distances[position[1] * WIDTH + position[0]]
+        return distance if distance >= 0 else None
+
+    def next_step(self, position: tuple[int, int]) -> tuple[int, int]:
+        """Returns the neighbouring tile one step closer to the target, or None if at it or no known route."""
+        tile = position[1] * WIDTH + position[0]
+        distance = self.distances[tile]
+        if distance <= 0:
+            return None
+        for node in self._neighbors(tile):
+            if self.distances[node] == distance - 1:
+                return (node % WIDTH, node // WIDTH)
+        return None
+
+
+def distance_field(
+    shared_knowledge: dict,
+    target_position: tuple[int, int],
+    flag_collider: str,
+) -> DistanceField:
+    """Returns the team's DistanceField to target_position, brought up to date with the shared map.
+
+    Fields are kept in shared_knowledge, so the team's agents share one per
+    target and each learned tile is processed once.
+    """
+    fields = shared_knowledge.setdefault("distance_fields", {})
+    key = (target_position, flag_collider)
+    field = fields.get(key)
+    if field is None:
+        field = fields[key] = DistanceField(target_position, flag_collider)
+    field.update(shared_knowledge.get("map", {}), shared_knowledge.setdefault("map_log", []))
+    return field
@@ -5,6 +5,7 @@ class MapMemory:
     """
     Simple exploration/movement memory:
     - Stores known map tiles
+    - Keeps the exploration frontier (known tiles next to unknown ones)
     - Remembers visited target tiles
     - Selects new random targets with left/right bias
     - Moves one step toward selected target (straight-line, not pathfinding)
@@ -25,6 +26,7 @@ class MapMemory:
     def update_map_memory(self, visible_world, agent_pos, shared_knowledge):
         ax, ay = agent_pos
         vr = len(visible_world) // 2  # vision radius
+        new_tiles = []
 
         for dy in range(len(visible_world)):
             for dx in range(len(visible_world[0])):
@@ -52,14 +54,50 @@ class MapMemory:
 
                 if "map" not in shared_knowledge:
                     shared_knowledge["map"] = {}
+                    shared_knowledge["map_log"] = []
 
-                # Store known tiles normally
+                # Store known tiles normally, logging them in the order they were learned
                 if (world_x, world_y) not in shared_knowledge["map"]:
                     shared_knowledge["map"][(world_x, world_y)] = tile
+                    shared_knowledge["map_log"].append((world_x, world_y))
+                    new_tiles.append((world_x, world_y))
 
                 if (world_x, world_y) not in self.known_map:
                     self.known_map[(world_x, world_y)] = tile
 
+        if new_tiles:
+            self.update_frontier(shared_knowledge, new_tiles)
+
+    # -------------------------------------------------------------
+    # Exploration frontier (walkable known tiles next to unknown ones)
+    # -------------------------------------------------------------
+    def get_frontier(self, shared_knowledge):
+        if "frontier" not in shared_knowledge:
+            shared_knowledge["frontier"] = set()
+        return shared_knowledge["frontier"]
+
+    def update_frontier(self, shared_knowledge, new_tiles):
+        """Re-checks the newly learned tiles and their neighbours, the only ones whose frontier status can change."""
+        shared_map = shared_knowledge["map"]
+        frontier = self.get_frontier(shared_knowledge)
+        visited_tiles = self.get_visited_tiles(shared_knowledge)
+
+        changed = set(new_tiles)
+        for x, y in new_tiles:
+            changed.update(((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)))
+
+        for x, y in changed:
+            tile = shared_map.get((x, y))
+            if tile is None or tile in "#/" or (x, y) in visited_tiles:
+                frontier.discard((x, y))
+                continue
+            for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                if 0 <= nx < self.map_width and 0 <= ny < self.map_height and (nx, ny) not in shared_map:
+                    frontier.add((x, y))
+                    break
+            else:
+                frontier.discard((x, y))
+
     def get_visited_tiles(self, shared_knowledge):
         if "visited_tiles" not in shared_knowledge:
             shared_knowledge["visited_tiles"] = set()
@@ -69,3 +107,4 @@ class MapMemory:
         if "visited_tiles" not in shared_knowledge:
             shared_knowledge["visited_tiles"] = set()
         shared_knowledge["visited_tiles"].update(tiles)
+        self.get_frontier(shared_knowledge).difference_update(tiles)
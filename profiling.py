@@ -0,0 +1,98 @@
+"""Per-agent decision latency and allocation accounting for a match.
+
+Set world.profiler = MatchProfiler() and AgentEngine.control times every
+Agent.update call with time.perf_counter. With trace_memory=True it also
+records, through tracemalloc, how many bytes each update allocated at its peak
+and how many it still held on return (tracemalloc slows agents down a lot, so
+only latencies are recorded by default).
+"""
+
+import time
+import tracemalloc
+from config import *
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def _summary(latencies, allocated, retained):
+    latencies = sorted(latencies)
+    summary = {
+        "calls": len(latencies),
+        "total_ms": sum(latencies) * 1000,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+    }
+    if allocated is not None:
+        summary["allocated_bytes"] = allocated
+        summary["retained_bytes"] = retained
+    return summary
+
+
+class MatchProfiler:
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.latencies = {} # (color, index) -> list of seconds
+        self.allocated = {} # (color, index) -> bytes
+        self.retained = {} # (color, index) -> bytes
+        self._started_tracemalloc = False
+        self.start_time = time.perf_counter()
+
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def begin(self):
+        """Called right before an agent update, returns what end() needs."""
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            return time.perf_counter(), tracemalloc.get_traced_memory()[0]
+        return time.perf_counter(), 0
+
+    def end(self, agent, started):
+        """Called right after an agent update with the value begin() returned."""
+        elapsed = time.perf_counter() - started[0]
+        key = (agent.color, agent.index)
+        self.latencies.setdefault(key, []).append(elapsed)
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            self.allocated[key] = self.allocated.get(key, 0) + peak - started[1]
+            self.retained[key] = self.retained.get(key, 0) + current - started[1]
+
+    def stop(self):
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def report(self, world, blue_team_name, red_team_name):
+        """Returns the machine-readable performance report of the match."""
+        self.stop()
+        report = {
+            "blue_team": blue_team_name,
+            "red_team": red_team_name,
+            "seed": world.seed,
+            "ticks": world.tick,
+            "winner": world.win[0] if world.win else None,
+            "reason": world.win[1] if world.win else None,
+            "wall_time_s": time.perf_counter() - self.start_time,
+            "agents": {},
+            "teams": {},
+        }
+        memory = self.trace_memory
+        for color in ("blue", "red"):
+            keys = sorted(key for key in self.latencies if key[0] == color)
+            for key in keys:
+                report["agents"][f"{color}_{key[1]}"] = _summary(
+                    self.latencies[key],
+                    self.allocated.get(key, 0) if memory else None,
+                    self.retained.get(key, 0) if memory else None,
+                )
+            report["teams"][color] = _summary(
+                [latency for key in keys for latency in self.latencies[key]],
+                sum(self.allocated.get(key, 0) for key in keys) if memory else None,
+                sum(self.retained.get(key, 0) for key in keys) if memory else None,
+            )
+        return report
@@ -0,0 +1,86 @@
+import pygame
+from config import *
+
+TILE_SIZE = 32 # Size of a sprite in pixels
+
+def setup_sprites():
+    """Loads all sprites from files and returns a dictionary mapping tiles to surfaces."""
+    sprites = {
+        ASCII_TILES["wall"]: pygame.image.load("sprites/wall.png").convert_alpha(),
+        ASCII_TILES["blue_agent"]: pygame.image.load("sprites/blue_agent.png").convert_alpha(),
+        ASCII_TILES["red_agent"]: pygame.image.load("sprites/red_agent.png").convert_alpha(),
+        ASCII_TILES["blue_agent_f"]: pygame.image.load("sprites/blue_agent_f.png").convert_alpha(),
+        ASCII_TILES["red_agent_f"]: pygame.image.load("sprites/red_agent_f.png").convert_alpha(),
+        ASCII_TILES["blue_flag"]: pygame.image.load("sprites/blue_flag.png").convert_alpha(),
+        ASCII_TILES["red_flag"]: pygame.image.load("sprites/red_flag.png").convert_alpha(),
+        ASCII_TILES["bullet"]: pygame.image.load("sprites/bullet.png").convert_alpha()
+    }
+    return sprites
+
+def handle_pygame_events():
+    """Handles user input, like closing the window."""
+    for event in pygame.event.get():
+        if event.type == pygame.QUIT:
+            return False
+        elif event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_ESCAPE:
+                return False
+    return True
+
+
+class Renderer:
+    """Draws the world to a window, redrawing only the cells that changed since the last frame.
+
+    Walls never change, so they are drawn once into a cached background surface.
+    Every frame compares worldmap_buffer to the tiles currently on screen,
+    restores the background under each changed cell, draws its new sprite and
+    updates just those rectangles of the display.
+    """
+
+    def __init__(self, width, height):
+        pygame.init()
+        self.screen = pygame.display.set_mode((width*TILE_SIZE, height*TILE_SIZE))
+        self.sprites = setup_sprites()
+        self.background = None
+        self.terrain = None # Terrain the background was drawn from
+        self.frame = None # Tiles currently on screen, as rows
+
+    def _draw_background(self, world):
+        self.background = pygame.Surface(self.screen.get_size()).convert()
+        self.background.fill((0, 0, 0))
+        wall = ASCII_TILES["wall"]
+        for y, row in enumerate(world.worldmap):
+            for x, tile in enumerate(row):
+                if tile == wall:
+                    self.background.blit(self.sprites[wall], (x*TILE_SIZE, y*TILE_SIZE))
+
+        self.terrain = world.terrain
+        self.frame = [list(row) for row in world.worldmap]
+        self.screen.blit(self.background, (0, 0))
+        pygame.display.flip()
+
+    def render(self, world):
+        """Draws the current world state to the screen."""
+        if world.terrain is not self.terrain:
+            self._draw_background(world)
+
+        dirty_rects = []
+        for y, row in enumerate(world.worldmap_buffer):
+            drawn = self.frame[y]
+            if row == drawn:
+                continue
+            for x, tile in enumerate(row):
+                if tile == drawn[x]:
+                    continue
+                rect = pygame.Rect(x*TILE_SIZE, y*TILE_SIZE, TILE_SIZE, TILE_SIZE)
+                self.screen.blit(self.background, rect, rect)
+                if tile in self.sprites:
+                    self.screen.blit(self.sprites[tile], rect)
+                drawn[x] = tile
+                dirty_rects.append(rect)
+
+        if dirty_rects:
+            pygame.display.update(dirty_rects)
+
+    def close(self):
+        pygame.quit()
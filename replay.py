@@ -0,0 +1,276 @@
+"""Compact match replays.
+
+A replay holds the seed, the map, every action the agents returned at each
+agent update, and a snapshot of the dynamic world state every
+REPLAY_KEYFRAME_INTERVAL ticks (with what the stalemate rule remembers of
+the match so far, when it is on). Playback rebuilds the map and feeds the
+recorded actions back through World.update_agents, so no agent code is
+imported or run, and seeking only replays the ticks after the closest keyframe.
+Bullet spawns are not stored separately: they are reproduced by the recorded
+"shoot" actions.
+"""
+
+import sys
+import time
+import argparse
+import bisect
+import struct
+import zlib
+from tournament import World, WIN_STATES
+from config import *
+
+MAGIC = b"CTFR"
+VERSION = 3 # Versions 1 (no stalemate settings) and 2 (no stalemate state in keyframes) are still read
+
+ACTIONS = ["", "move", "shoot"]
+DIRECTIONS = [None, "left", "right", "up", "down"]
+_ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+_DIRECTION_CODES = {direction: code for code, direction in enumerate(DIRECTIONS)}
+
+_HEADER = struct.Struct("<BQHHhhhhIIB") # version, seed, width, height, flags, final tick, keyframe interval, win
+_STALEMATE = struct.Struct("<IH") # stalemate window (0 for none), cycle repeats, from version 2 on
+_UPDATE = struct.Struct("<IB") # tick, number of actions
+_ACTION = struct.Struct("<BB") # red << 7 | index, action << 4 | direction
+_KEYFRAME = struct.Struct("<II") # tick, state length
+_KEYFRAME_STALEMATE = struct.Struct("<I") # stalemate state length, from version 3 on
+
+def _pack_string(text):
+    data = text.encode("utf-8")
+    return struct.pack("<H", len(data)) + data
+
+def _unpack_string(data, offset):
+    (length,) = struct.unpack_from("<H", data, offset)
+    offset += 2
+    return data[offset:offset+length].decode("utf-8"), offset + length
+
+
+class ReplayRecorder:
+    """Records a match as it is played. Attach it with world.replay = ReplayRecorder(world, ...)."""
+
+    def __init__(self, world, blue_team="", red_team="", keyframe_interval=REPLAY_KEYFRAME_INTERVAL):
+        self.blue_team = blue_team
+        self.red_team = red_team
+        self.seed = world.seed
+        self.width = world.width
+        self.height = world.height
+        self.terrain = bytes(world.terrain)
+        self.flag_positions = [flag.spawn_position for flag in world.flags]
+        self.keyframe_interval = keyframe_interval
+        self.stalemate_window = world.stalemate_window
+        self.stalemate_cycle_repeats = world.stalemate_cycle_repeats
+
+        self.updates = {} # tick -> list of packed actions
+        self.keyframes = [] # (tick, snapshot, stalemate snapshot)
+        self.next_keyframe_tick = 0
+        self.final_tick = 0
+        self.win = None
+
+    def record_action(self, tick, agent, action, direction):
+        # Unknown actions and directions behave exactly like "" and None in the engine
+        action_code = _ACTION_CODES.get(action, 0) if isinstance(action, str) else 0
+        direction_code = _DIRECTION_CODES.get(direction, 0) if isinstance(direction, str) else 0
+        self.updates.setdefault(tick, []).append(_ACTION.pack((agent.color == "red") << 7 | agent.index, action_code << 4 | direction_code))
+
+    def record_keyframe(self, world):
+        if world.tick >= self.next_keyframe_tick:
+            stalemate = world.stalemate_snapshot() if world.stalemate_window else b""
+            self.keyframes.append((world.tick, world.snapshot(), stalemate))
+            self.next_keyframe_tick = (world.tick // self.keyframe_interval + 1) * self.keyframe_interval
+
+    def finish(self, world):
+        self.final_tick = world.tick
+        self.win = world.win
+
+    def save(self, path):
+        data = [MAGIC, _HEADER.pack(
+            VERSION, self.seed, self.width, self.height,
+            *self.flag_positions[0], *self.flag_positions[1],
+            self.final_tick, self.keyframe_interval, WIN_STATES.index(self.win)
+        ), _STALEMATE.pack(self.stalemate_window or 0, self.stalemate_cycle_repeats)]
+        data.append(_pack_string(self.blue_team))
+        data.append(_pack_string(self.red_team))
+        data.append(self.terrain)
+
+        data.append(struct.pack("<I", len(self.updates)))
+        for tick, actions in self.updates.items():
+            data.append(_UPDATE.pack(tick, len(actions)))
+            data.extend(actions)
+
+        data.append(struct.pack("<I", len(self.keyframes)))
+        for tick, state, stalemate in self.keyframes:
+            data.append(_KEYFRAME.pack(tick, len(state)))
+            data.append(state)
+            data.append(_KEYFRAME_STALEMATE.pack(len(stalemate)))
+            data.append(stalemate)
+
+        with open(path, "wb") as f:
+            f.write(MAGIC + zlib.compress(b"".join(data[1:]), 9))
+
+
+class Replay:
+    """A recorded match loaded from a replay file."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            raw = f.read()
+        if raw[:4] != MAGIC:
+            raise ValueError(f"Not a replay file: {path}")
+        data = zlib.decompress(raw[4:])
+
+        (version, self.seed, self.width, self.height, blue_x, blue_y, red_x, red_y,
+         self.final_tick, self.keyframe_interval, win) = _HEADER.unpack_from(data)
+        if version not in (1, 2, VERSION):
+            raise ValueError(f"Unsupported replay version {version}: {path}")
+        self.flag_positions = [(blue_x, blue_y), (red_x, red_y)]
+        self.win = WIN_STATES[win]
+        offset = _HEADER.size
+
+        # Matches recorded before the stalemate rule always played to the end
+        self.stalemate_window, self.stalemate_cycle_repeats = None, STALEMATE_CYCLE_REPEATS
+        if version >= 2:
+            stalemate_window, self.stalemate_cycle_repeats = _STALEMATE.unpack_from(data, offset)
+            self.stalemate_window = stalemate_window or None
+            offset += _STALEMATE.size
+
+        self.blue_team, offset = _unpack_string(data, offset)
+        self.red_team, offset = _unpack_string(data, offset)
+        self.terrain = data[offset:offset + self.width*self.height]
+        offset += self.width*self.height
+
+        self.actions = {} # tick -> {(color, index): (action, direction)}
+        (update_count,) = struct.unpack_from("<I", data, offset)
+        offset += 4
+        for _ in range(update_count):
+            tick, count = _UPDATE.unpack_from(data, offset)
+            offset += _UPDATE.size
+            actions = {}
+            for _ in range(count):
+                agent, code = _ACTION.unpack_from(data, offset)
+                offset += _ACTION.size
+                color = "red" if agent >> 7 else "blue"
+                actions[(color, agent & 0x7f)] = (ACTIONS[code >> 4], DIRECTIONS[code & 0xf])
+            self.actions[tick] = actions
+
+        # (tick, snapshot, stalemate snapshot), in tick order; the stalemate
+        # snapshot is None in older replays and empty without the stalemate rule
+        self.keyframes = []
+        (keyframe_count,) = struct.unpack_from("<I", data, offset)
+        offset += 4
+        for _ in range(keyframe_count):
+            tick, length = _KEYFRAME.unpack_from(data, offset)
+            offset += _KEYFRAME.size
+            state = data[offset:offset+length]
+            offset += length
+            stalemate = None
+            if version >= 3:
+                (length,) = _KEYFRAME_STALEMATE.unpack_from(data, offset)
+                offset += _KEYFRAME_STALEMATE.size
+                stalemate = data[offset:offset+length]
+                offset += length
+            self.keyframes.append((tick, state, stalemate))
+
+    def rows(self):
+        """Returns the recorded map as rows of tiles."""
+        return [self.terrain[y*self.width:(y+1)*self.width].decode("ascii") for y in range(self.height)]
+
+
+class ReplayPlayer:
+    """Reconstructs any tick of a recorded match by re-simulating it from the recorded actions."""
+
+    def __init__(self, replay):
+        self.replay = replay
+        self.world = self._new_world()
+
+    def _new_world(self):
+        # A headless world never sleeps between ticks, the caller sets the pace of playback
+        replay = self.replay
+        world = World(replay.height, replay.width, 0, None, None, headless=True, seed=replay.seed,
+                      stalemate_window=replay.stalemate_window, stalemate_cycle_repeats=replay.stalemate_cycle_repeats)
+        world.load_map(replay.rows(), *replay.flag_positions)
+        world.buffer_worldmap()
+        return world
+
+    def seek(self, tick):
+        """Moves playback to the start of the given tick, resuming from the closest keyframe."""
+        tick = max(0, min(tick, self.replay.final_tick))
+        keyframes = self.replay.keyframes
+        if self.replay.stalemate_window and keyframes and keyframes[0][2] is None:
+            # Version 2 keyframes don't hold the stalemate state, which depends on the whole match so far
+            if self.world.tick > tick:
+                self.world = self._new_world()
+            keyframes = []
+        keyframe_ticks = [keyframe[0] for keyframe in keyframes]
+        i = bisect.bisect_right(keyframe_ticks, tick) - 1
+        # Playing on from the current tick is cheaper if it lies between the keyframe and the target
+        if i >= 0 and not keyframe_ticks[i] <= self.world.tick <= tick:
+            _, state, stalemate = keyframes[i]
+            self.world.restore(state)
+            if self.replay.stalemate_window:
+                self.world.stalemate_restore(stalemate)
+        while self.world.tick < tick and not self.world.win:
+            self.step()
+        self.world.buffer_worldmap()
+        return self.world
+
+    def step(self):
+        """Plays one tick of the recording."""
+        self.world.step(self.replay.actions.get(self.world.tick, {}))
+
+    def play(self, start_tick=0):
+        """Yields the world after every tick from start_tick until the end of the match."""
+        self.seek(start_tick)
+        while not self.world.win and self.world.tick < self.replay.final_tick:
+            self.step()
+            yield self.world
+
+
+def main(args):
+    replay = Replay(args.replay_file)
+    print(f"{replay.blue_team} (blue) vs {replay.red_team} (red), seed {replay.seed}, {replay.final_tick} ticks")
+
+    player = ReplayPlayer(replay)
+    if args.ascii:
+        from ascii_renderer import AsciiRenderer
+        ascii_renderer = AsciiRenderer(fps=args.fps)
+    if args.gui:
+        from renderer import Renderer, handle_pygame_events
+        renderer = Renderer(replay.width, replay.height)
+
+    for world in player.play(args.start):
+        if args.ascii:
+            ascii_renderer.render(world)
+            time.sleep(TICK_RATE)
+        if args.gui:
+            renderer.render(world)
+            time.sleep(TICK_RATE)
+            if not handle_pygame_events():
+                break
+
+    world = player.world
+    if args.ascii:
+        ascii_renderer.render(world, force=True)
+        ascii_renderer.close()
+    if replay.win == ("tied", "aborted"):
+        # The match was stopped by hand, there is no result to reproduce
+        print(f"The match was aborted at tick {replay.final_tick}")
+    else:
+        if world.win:
+            winner, reason = world.win
+            print(f"Replayed result: {winner}, {reason} at tick {world.tick}")
+        else:
+            print(f"Replay reached tick {world.tick} without a result")
+        if (world.win, world.tick) != (replay.win, replay.final_tick):
+            print(f"Replay does not match the recorded result: {replay.win[0]}, {replay.win[1]} at tick {replay.final_tick}")
+            sys.exit(1)
+    if args.gui:
+        renderer.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play back a recorded AI Agent Capture the Flag match")
+    parser.add_argument("replay_file", help="Replay recorded with main.py --record")
+    parser.add_argument("--start", "-t", type=int, default=0, help="Tick to start playback from")
+    parser.add_argument("--ascii", "-A", action="store_true", help="Display ASCII rendering in the console")
+    parser.add_argument("--fps", type=float, default=ASCII_FPS, help="Frames per second drawn at most by --ascii")
+    parser.add_argument("--gui", "-G", action="store_true", help="Display the match in a window")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,163 @@
+"""Match results in an SQLite database.
+
+Every match is stored with its seed, length in ticks, wall-clock time, win
+reason and a version hash of both teams' code. Writes are queued and inserted
+in batches, and each batch also updates per-pairing win counts and Elo ratings,
+so standings never need a scan of the full history. The database uses WAL
+mode, so several tournaments can write to it at the same time while others read.
+
+    python results_store.py results.db                  # ratings and pairings
+    python results_store.py results.db --export out.csv # results.csv format
+"""
+
+import os
+import csv
+import time
+import sqlite3
+import argparse
+from config import *
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    id INTEGER PRIMARY KEY,
+    blue TEXT NOT NULL,
+    red TEXT NOT NULL,
+    winner TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    seed INTEGER,
+    ticks INTEGER,
+    wall_time REAL,
+    blue_version TEXT,
+    red_version TEXT,
+    played_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pair_stats (
+    team_a TEXT NOT NULL,
+    team_b TEXT NOT NULL,
+    a_wins INTEGER NOT NULL DEFAULT 0,
+    b_wins INTEGER NOT NULL DEFAULT 0,
+    ties INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (team_a, team_b)
+);
+CREATE TABLE IF NOT EXISTS ratings (
+    team TEXT PRIMARY KEY,
+    rating REAL NOT NULL,
+    matches INTEGER NOT NULL
+);
+"""
+
+def _expected_score(rating, opponent_rating):
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+class ResultsStore:
+    """Queues match results and writes them to the database in batches of batch_size."""
+
+    def __init__(self, path=RESULTS_DB_FILE, batch_size=RESULTS_BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = []
+
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def record(self, blue, red, winner, reason, seed=None, ticks=None, wall_time=None, blue_version=None, red_version=None):
+        """Queues one match result, writing the queue out once it holds batch_size results."""
+        self.pending.append((blue, red, winner, reason, seed, ticks, wall_time, blue_version, red_version, time.time()))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Writes all queued results, their pairing counts and the rating changes in one transaction."""
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+
+        # BEGIN IMMEDIATE takes the write lock before the ratings are read,
+        # so another writer can't update them in between
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.executemany(
+                "INSERT INTO matches (blue, red, winner, reason, seed, ticks, wall_time, blue_version, red_version, played_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+
+            pairs = {}
+            teams = set()
+            for blue, red, winner, *_ in batch:
+                teams.update((blue, red))
+                # Pairings are stored once, with the team names in sorted order
+                team_a, team_b = sorted((blue, red))
+                counts = pairs.setdefault((team_a, team_b), [0, 0, 0])
+                if winner == "tied":
+                    counts[2] += 1
+                elif (blue if winner == "blue" else red) == team_a:
+                    counts[0] += 1
+                else:
+                    counts[1] += 1
+            self.connection.executemany(
+                "INSERT INTO pair_stats (team_a, team_b, a_wins, b_wins, ties) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (team_a, team_b) DO UPDATE SET "
+                "a_wins = a_wins + excluded.a_wins, b_wins = b_wins + excluded.b_wins, ties = ties + excluded.ties",
+                [(*pair, *counts) for pair, counts in pairs.items()])
+
+            placeholders = ", ".join("?" * len(teams))
+            ratings = {team: [ELO_INITIAL_RATING, 0] for team in teams}
+            for team, rating, matches in self.connection.execute(
+                    f"SELECT team, rating, matches FROM ratings WHERE team IN ({placeholders})", sorted(teams)):
+                ratings[team] = [rating, matches]
+            for blue, red, winner, *_ in batch:
+                score = 0.5 if winner == "tied" else float(winner == "blue")
+                expected = _expected_score(ratings[blue][0], ratings[red][0])
+                ratings[blue][0] += ELO_K_FACTOR * (score - expected)
+                ratings[red][0] -= ELO_K_FACTOR * (score - expected)
+                ratings[blue][1] += 1
+                ratings[red][1] += 1
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO ratings (team, rating, matches) VALUES (?, ?, ?)",
+                [(team, rating, matches) for team, (rating, matches) in ratings.items()])
+
+    def ratings(self):
+        """Returns [(team, rating, matches)], best rated first."""
+        return self.connection.execute("SELECT team, rating, matches FROM ratings ORDER BY rating DESC").fetchall()
+
+    def pair_stats(self):
+        """Returns [(team_a, team_b, a_wins, b_wins, ties)] for every pairing that has played."""
+        return self.connection.execute(
+            "SELECT team_a, team_b, a_wins, b_wins, ties FROM pair_stats ORDER BY team_a, team_b").fetchall()
+
+    def export_csv(self, path):
+        """Writes every stored match to path in the results.csv format (blue, red, winner, reason)."""
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            rows = self.connection.execute("SELECT blue, red, winner, reason FROM matches ORDER BY id")
+            while True:
+                batch = rows.fetchmany(1000)
+                if not batch:
+                    break
+                writer.writerows(batch)
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show or export the match results stored in a results database")
+    parser.add_argument("database", nargs="?", default=RESULTS_DB_FILE, help="Results database")
+    parser.add_argument("--export", metavar="CSV_FILE", default=None, help="Write every match to a CSV file in the results.csv format")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.database):
+        parser.error(f"Results database not found: {args.database}")
+    store = ResultsStore(args.database)
+    if args.export:
+        store.export_csv(args.export)
+    else:
+        print(f"{'Team':<24}{'Rating':>8}{'Matches':>9}")
+        for team, rating, matches in store.ratings():
+            print(f"{team:<24}{rating:>8.0f}{matches:>9}")
+        print(f"\n{'Pairing':<40}{'Wins':>7}{'Losses':>7}{'Ties':>6}{'Win rate':>10}")
+        for team_a, team_b, a_wins, b_wins, ties in store.pair_stats():
+            played = a_wins + b_wins + ties
+            print(f"{team_a + ' vs ' + team_b:<40}{a_wins:>7}{b_wins:>7}{ties:>6}{(a_wins + ties / 2) / played:>10.1%}")
+    store.close()
@@ -0,0 +1,140 @@
+import sys
+import os
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tournament import run_match
+from main import log_match_result, time_budget_ms
+from agent_loader import team_version
+from results_store import ResultsStore
+from map_corpus import open_corpus
+from config import *
+
+# Folders next to main.py that are never entered into a round-robin.
+# The human player needs a keyboard and a window, so it can't run headless.
+EXCLUDED_FOLDERS = ["human_player", "sprites"]
+
+def discover_teams(root=".", exclude=EXCLUDED_FOLDERS):
+    """Returns every folder under root that contains an agent.py, sorted by name."""
+    teams = []
+    for name in sorted(os.listdir(root)):
+        if name.startswith(".") or name.startswith("__") or name in exclude:
+            continue
+        folder = os.path.join(root, name)
+        if os.path.isfile(os.path.join(folder, "agent.py")):
+            teams.append(os.path.relpath(folder))
+    return teams
+
+def schedule_matches(teams, seeds, base_seed=0):
+    """Pairs every team with every other team in both colour assignments, once per seed."""
+    matches = []
+    for seed in range(base_seed, base_seed + seeds):
+        for blue_team, red_team in itertools.permutations(teams, 2):
+            matches.append((blue_team, red_team, seed))
+    return matches
+
+def play_match(blue_team_folder, red_team_folder, seed, verbose=False, replay_dir=None, time_budget=None, profile=False, maps=None, map_id=None,
+               stalemate_window=STALEMATE_WINDOW):
+    """Plays one headless match in the calling process and returns its MatchResult.
+
+    With a time budget (in seconds) each team runs in its own process and
+    updates that take longer are skipped. With a map corpus file the match is
+    played on its map map_id instead of a generated one. Matches without
+    progress for stalemate_window ticks are tied early (None plays them out).
+    This runs inside the pool workers, so it must stay a top-level function.
+    """
+    record = None
+    if replay_dir:
+        record = os.path.join(replay_dir, f"{os.path.basename(blue_team_folder)}_vs_{os.path.basename(red_team_folder)}_{seed}.ctfr")
+    return run_match(blue_team_folder, red_team_folder, seed, agent_output="show" if verbose else "discard",
+                     time_budget=time_budget, profile=profile, record=record, maps=maps, map_id=map_id, stalemate_window=stalemate_window)
+
+def print_standings(standings):
+    print(f"\n{'Team':<24}{'Won':>6}{'Lost':>6}{'Tied':>6}")
+    for team, (won, lost, tied) in sorted(standings.items(), key=lambda item: (-item[1][0], item[1][1])):
+        print(f"{team:<24}{won:>6}{lost:>6}{tied:>6}")
+
+def run_tournament(teams, seeds, base_seed=0, workers=None, verbose=False, replay_dir=None, time_budget=None, profile=False, store=None, maps=None,
+                   stalemate_window=STALEMATE_WINDOW):
+    """Plays all scheduled matches on a process pool, logging each result as it finishes.
+
+    Results also go to store (a ResultsStore) when given, which is flushed at
+    the end. With a map corpus file, every seed is played on a map from a
+    sample stratified by flag distance instead of a generated map.
+    """
+    matches = schedule_matches(teams, seeds, base_seed)
+    map_ids = dict(zip(range(base_seed, base_seed + seeds), open_corpus(maps).sample(seeds, base_seed))) if maps else {}
+    versions = {team: team_version(team) for team in teams} if store else {}
+    standings = {team: [0, 0, 0] for team in teams}
+    errors = 0
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = {pool.submit(play_match, blue, red, seed, verbose, replay_dir, time_budget, profile, maps, map_ids.get(seed),
+                               stalemate_window): (blue, red, seed)
+                   for blue, red, seed in matches}
+        for done, future in enumerate(as_completed(futures), start=1):
+            blue, red, seed = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                errors += 1
+                print(f"[{done}/{len(matches)}] {blue} vs {red} (seed {seed}): error: {e!r}")
+                continue
+
+            # Only the parent writes results.csv, so lines never interleave
+            winner, reason = result.winner, result.reason
+            log_match_result(blue, red, winner, reason, result.report)
+            if store:
+                store.record(blue, red, winner, reason, seed, result.ticks, result.timings["match"], versions[blue], versions[red])
+            if winner == "blue":
+                standings[blue][0] += 1
+                standings[red][1] += 1
+            elif winner == "red":
+                standings[red][0] += 1
+                standings[blue][1] += 1
+            else:
+                standings[blue][2] += 1
+                standings[red][2] += 1
+            on_map = f", map {map_ids[seed]}" if maps else ""
+            print(f"[{done}/{len(matches)}] {blue} vs {red} (seed {seed}{on_map}): {winner}, {reason}")
+
+    if store:
+        store.flush()
+    print_standings(standings)
+    return standings, errors
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Round-robin AI Agent Capture the Flag Tournament")
+    parser.add_argument("teams", nargs="*", help="Team folders to enter (default: every folder with an agent.py)")
+    parser.add_argument("--seeds", "-n", type=int, default=1, help="Matches per pairing and colour assignment")
+    parser.add_argument("--base-seed", type=int, default=0, help="Seed of the first match of every pairing")
+    parser.add_argument("--workers", "-j", type=int, default=None, help="Worker processes (default: number of cores)")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Show agent output from the workers")
+    parser.add_argument("--isolate", "-I", action="store_true", help="Run each team's agents in a separate process with a time budget")
+    parser.add_argument("--time-budget", type=time_budget_ms, default=AGENT_TIME_BUDGET*1000, help="Milliseconds an isolated agent update may take before it is skipped")
+    parser.add_argument("--profile", "-P", action="store_true", help=f"Time every agent update and append a report per match to {PERFORMANCE_REPORT_FILE}")
+    parser.add_argument("--db", metavar="DATABASE", default=None, help=f"Also store every result in this SQLite database (e.g. {RESULTS_DB_FILE})")
+    parser.add_argument("--maps", metavar="CORPUS", default=None, help="Play on maps sampled from a corpus built with map_corpus.py")
+    parser.add_argument("--stalemate-window", type=int, default=STALEMATE_WINDOW, metavar="TICKS",
+                        help="Tie matches after this many ticks without progress, or that keep repeating themselves (0 plays every match to the end)")
+    parser.add_argument("--replays", metavar="DIR", default=None, help="Record a replay of every match into this folder")
+    args = parser.parse_args()
+
+    teams = args.teams or discover_teams()
+    if len(teams) < 2:
+        print("A tournament needs at least two team folders.")
+        sys.exit(1)
+
+    if args.replays:
+        os.makedirs(args.replays, exist_ok=True)
+
+    time_budget = args.time_budget / 1000 if args.isolate else None
+    store = ResultsStore(args.db) if args.db else None
+    try:
+        _, errors = run_tournament(teams, args.seeds, args.base_seed, args.workers, args.verbose, args.replays, time_budget, args.profile,
+                                   store, args.maps, args.stalemate_window or None)
+    finally:
+        if store:
+            store.close()
+    if errors:
+        sys.exit(1)
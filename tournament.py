@@ -1,12 +1,100 @@
 import time
 import random
-import copy
-import os
+import struct
+import collections
+from visibility import get_visibility_table
+from ascii_renderer import AsciiRenderer
+from agent_loader import load_agent_class
+from agent_logs import AgentLogCapture, call_with_output
 from config import *
 
+_WALL = ord(ASCII_TILES["wall"])
+
+# Every value World.win can take, snapshots store the position in this list
+WIN_STATES = [
+    None,
+    ("blue", "flag_capture"), ("red", "flag_capture"),
+    ("blue", "elimination"), ("red", "elimination"),
+    ("tied", "mutual_elimination"), ("tied", "timeout"),
+    ("tied", "stalemate"),
+    ("tied", "aborted"), # The match was stopped before it ended, e.g. by closing the window
+]
+
+# Binary layout of World.snapshot()
+_STATE_HEADER = struct.Struct("<IBBBH") # tick, win, agents, flags, bullets
+_AGENT_STATE = struct.Struct("<BBhhhhhhBB") # red, index, position, prev_position, hp, ammo, can_shoot, countdown
+_FLAG_STATE = struct.Struct("<hhB") # position, slot of the agent holding it
+_BULLET_STATE = struct.Struct("<hhbbB") # position, direction, red
+_NO_HOLDER = 255
+
+# Binary layout of World.stalemate_snapshot()
+_STALEMATE_HEADER = struct.Struct("<IBBBHH") # progress tick, stalemate, progress agents (255: none yet), progress flags, visited, states seen
+_PROGRESS_AGENT = struct.Struct("<BBh") # red, index, hp
+_PROGRESS_FLAG = struct.Struct("<hhB") # position, held
+_VISITED = struct.Struct("<hh")
+_STATE_SEEN = struct.Struct("<HH") # state length, times seen, followed by the state
+_NO_PROGRESS = 255
+
+# The dynamic world state World.snapshot() packs, see pack_state and unpack_state
+AgentState = collections.namedtuple("AgentState", "color index position prev_position hp ammo can_shoot countdown")
+FlagState = collections.namedtuple("FlagState", "position holder") # holder: position in agents, or None
+BulletState = collections.namedtuple("BulletState", "color position direction")
+GameState = collections.namedtuple("GameState", "tick win agents flags bullets") # flags: blue, then red
+
+def pack_state(game_state):
+    """Packs a GameState into bytes, the format of World.snapshot().
+
+    Plain tuples in the field order of the named tuples work as well.
+    """
+    tick, win, agents, flags, bullets = game_state
+    state = [_STATE_HEADER.pack(tick, WIN_STATES.index(win), len(agents), len(flags), len(bullets))]
+    for color, index, position, prev_position, hp, ammo, can_shoot, countdown in agents:
+        state.append(_AGENT_STATE.pack(color == "red", index, *position, *prev_position, hp, ammo, can_shoot, countdown))
+    for position, holder in flags:
+        state.append(_FLAG_STATE.pack(*position, _NO_HOLDER if holder is None else holder))
+    for color, position, direction in bullets:
+        state.append(_BULLET_STATE.pack(*position, *direction, color == "red"))
+    return b"".join(state)
+
+def _unpack_records(state):
+    # tick, win and the raw struct records of the agents, flags and bullets
+    tick, win, agent_count, flag_count, bullet_count = _STATE_HEADER.unpack_from(state)
+    start = _STATE_HEADER.size
+    end = start + agent_count*_AGENT_STATE.size
+    agents = _AGENT_STATE.iter_unpack(state[start:end])
+    start, end = end, end + flag_count*_FLAG_STATE.size
+    flags = _FLAG_STATE.iter_unpack(state[start:end])
+    start, end = end, end + bullet_count*_BULLET_STATE.size
+    bullets = _BULLET_STATE.iter_unpack(state[start:end])
+    return tick, WIN_STATES[win], agents, flags, bullets
+
+def unpack_state(state):
+    """Returns the GameState packed in bytes from pack_state() or World.snapshot()."""
+    tick, win, agents, flags, bullets = _unpack_records(state)
+    return GameState(
+        tick,
+        win,
+        [AgentState("red" if red else "blue", index, (x, y), (prev_x, prev_y), hp, ammo, bool(can_shoot), countdown)
+         for red, index, x, y, prev_x, prev_y, hp, ammo, can_shoot, countdown in agents],
+        [FlagState((x, y), None if holder == _NO_HOLDER else holder) for x, y, holder in flags],
+        [BulletState("red" if red else "blue", (x, y), (dx, dy)) for x, y, dx, dy, red in bullets],
+    )
+
+def state_win(state):
+    """Returns the win of packed state bytes (None while playing), without unpacking the rest."""
+    return WIN_STATES[_STATE_HEADER.unpack_from(state)[1]]
+
+def _spawn_points(color, flag_pos):
+    """Returns the starting positions of a team's agents around its flag."""
+    x, y = flag_pos
+    if color == "blue":
+        return [(x + 2, y), (x, y + 2), (x, y - 2)]
+    return [(x - 2, y), (x, y + 2), (x, y - 2)]
+
 class World:
 
-    def __init__(self, height, width, tick_rate, blue_agent_class, red_agent_class, headless=False, ascii_mode=False):
+    def __init__(self, height, width, tick_rate, blue_agent_class, red_agent_class, headless=False, ascii_mode=False, seed=None, skip_idle_ticks=False, agent_output="show",
+                 stalemate_window=None, stalemate_cycle_repeats=STALEMATE_CYCLE_REPEATS):
         self.height = height
         self.width = width
         self.tick_rate = tick_rate
@@ -14,18 +102,47 @@ class World:
         self.red_agent_class = red_agent_class
         self.headless = headless
         self.ascii_mode = ascii_mode
+        # Jump straight over ticks on which nothing can happen (only sensible without a display)
+        self.skip_idle_ticks = skip_idle_ticks
+        # Matches without progress for stalemate_window ticks, or that keep coming back to the
+        # same state, end in a tie early (see _check_stalemate). None plays every match to the end.
+        self.stalemate_window = stalemate_window
+        self.stalemate_cycle_repeats = stalemate_cycle_repeats
+        self.stalemate = False
+        self._progress = None # Agent HP and flag positions at the last progress
+        self._progress_tick = 0
+        self._states_seen = {} # Dynamic state -> times seen since the last progress
+        self._visited = set() # Every position an agent has stood on
+        # "show" lets agents print to the terminal, "capture" and "discard" redirect it (see agent_logs)
+        self.agent_logs = AgentLogCapture(agent_output) if agent_output != "show" else None
+
+        # Each world owns its random stream, so worlds sharing a process don't interleave
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rng = random.Random(self.seed)
         
         self.tick = 0
         self.worldmap = None
+        self.terrain = None # Static tiles as one byte per cell, row by row
         self.worldmap_buffer = None
+        self._overlay = {} # (x, y) -> tile of every dynamic object drawn on the buffer
+        self._tile_bytes = None # Padded byte copy of the buffer for array observations, made on first use
+        self._tile_array = None
+        self._sight = {} # (x, y) -> what an agent standing there sees through the terrain, see sight()
         self.win = None # Becomes a tuple (winner, reason)
         
         self.agents = []
         self.flags = []
-        self.bullets = []
+        self.bullets = Bullets()
         
         self.blue_shared_knowledge = {}
         self.red_shared_knowledge = {}
+        self.agent_counts = {"blue": 0, "red": 0}
+        self._agent_engines = {} # (color, index) -> AgentEngine, including dead agents
+        self._team_map_teams = set() # Teams whose agents asked for a team map, see _update_team_map
+
+        self.replay = None # Set to a replay.ReplayRecorder to record the match
+        self.profiler = None # Set to a profiling.MatchProfiler to time agent updates
+        self.ascii_renderer = None # Set to an ascii_renderer.AsciiRenderer to configure ascii_display
     
     def _clear_area(self, x, y):
         for yi in [-1, 0, 1]:
@@ -34,23 +151,23 @@ class World:
     
     def _clear_random_path(self, flag_blue_pos, flag_red_pos):
         position = flag_blue_pos
-        while position[0] < (WIDTH+1)/2:
+        while position[0] < (self.width+1)/2:
             self.worldmap[position[1]][position[0]] = ASCII_TILES["empty"]
-            r = random.random()
+            r = self.rng.random()
             if r > 0.75 and position[1] > 3:
                 position = (position[0], position[1]-1)
-            elif r > 0.5 and position[1] < HEIGHT-4:
+            elif r > 0.5 and position[1] < self.height-4:
                 position = (position[0], position[1]+1)
             else:
                 position = (position[0]+1, position[1])
         position_left = position
         position = flag_red_pos
-        while position[0] > (WIDTH-1)/2:
+        while position[0] > (self.width-1)/2:
             self.worldmap[position[1]][position[0]] = ASCII_TILES["empty"]
-            r = random.random()
+            r = self.rng.random()
             if r > 0.75 and position[1] > 3:
                 position = (position[0], position[1]-1)
-            elif r > 0.5 and position[1] < HEIGHT-4:
+            elif r > 0.5 and position[1] < self.height-4:
                 position = (position[0], position[1]+1)
             else:
                 position = (position[0]-1, position[1])
@@ -67,60 +184,175 @@ class World:
             do_vertical_line = False
         if do_vertical_line:
             for yi in range(beg_y, end_y):
-                self.worldmap[yi][WIDTH//2] = ASCII_TILES["empty"]
+                self.worldmap[yi][self.width//2] = ASCII_TILES["empty"]
+
+    def _spawn_agent(self, color, position):
+        # Agent indices are numbered per world and per team, starting at 0
+        index = self.agent_counts[color]
+        self.agent_counts[color] += 1
+        agent_class = self.blue_agent_class if color == "blue" else self.red_agent_class
+        output = self.agent_logs.output_for(color, index) if self.agent_logs else None
+        agent = AgentEngine(color, position, agent_class, index, output)
+        self._agent_engines[(color, index)] = agent
+        if getattr(agent.agent, "team_map", False) is True:
+            self._team_map_teams.add(color)
+        return agent
 
     def generate_world(self):
         self.worldmap = [[ASCII_TILES["empty"] for _ in range(self.width)] for _ in range(self.height)]
 
         for y in range(len(self.worldmap)):
             for x in range(len(self.worldmap[0])):
-                if random.random() > 0.7 and (y != 1 and y != self.height-2):
+                if self.rng.random() > 0.7 and (y != 1 and y != self.height-2):
                     self.worldmap[y][x] = ASCII_TILES["wall"]
                 if x == 0 or x == self.width-1 or y == 0 or y == self.height-1:
                     self.worldmap[y][x] = ASCII_TILES["wall"]
 
-        flag_x = random.randint(3, 5)
-        flag_y = random.randint(4, self.height - 5)
-        flag_blue_pos = (flag_x, flag_y)
-        self._clear_area(flag_x, flag_y)
-        self.flags.append( Flag("blue", (flag_x, flag_y)) )
-
-        self.agents.append( AgentEngine("blue", (flag_x + 2, flag_y), self.blue_agent_class) )
-        self._clear_area(flag_x + 2, flag_y)
-        self.agents.append( AgentEngine("blue", (flag_x, flag_y + 2), self.blue_agent_class) )
-        self._clear_area(flag_x, flag_y + 2)
-        self.agents.append( AgentEngine("blue", (flag_x, flag_y - 2), self.blue_agent_class) )
-        self._clear_area(flag_x, flag_y - 2)
-
-        flag_x = random.randint(self.width - 6, self.width - 4)
-        flag_y = random.randint(4, self.height - 5)
-        flag_red_pos = (flag_x, flag_y)
-        self._clear_area(flag_x, flag_y)
-        self.flags.append( Flag("red", (flag_x, flag_y)) )
-
-        self.agents.append( AgentEngine("red", (flag_x - 2, flag_y), self.red_agent_class) )
-        self._clear_area(flag_x - 2, flag_y)
-        self.agents.append( AgentEngine("red", (flag_x, flag_y + 2), self.red_agent_class) )
-        self._clear_area(flag_x, flag_y + 2)
-        self.agents.append( AgentEngine("red", (flag_x, flag_y - 2), self.red_agent_class) )
-        self._clear_area(flag_x, flag_y - 2)
+        flag_blue_pos = (self.rng.randint(3, 5), self.rng.randint(4, self.height - 5))
+        flag_red_pos = (self.rng.randint(self.width - 6, self.width - 4), self.rng.randint(4, self.height - 5))
+
+        # Clear the flags and the spawn points around them
+        for color, flag_pos in (("blue", flag_blue_pos), ("red", flag_red_pos)):
+            self._clear_area(*flag_pos)
+            for position in _spawn_points(color, flag_pos):
+                self._clear_area(*position)
 
         self._clear_random_path(flag_blue_pos, flag_red_pos)
+        self.load_map(self.worldmap, flag_blue_pos, flag_red_pos)
+
+    def load_map(self, worldmap, flag_blue_pos, flag_red_pos):
+        """Places the flags and both teams on a ready-made map, given as rows of tiles."""
+        self.worldmap = [list(row) for row in worldmap]
+        self._build_terrain()
+
+        self.flags.append( Flag("blue", flag_blue_pos) )
+        for position in _spawn_points("blue", flag_blue_pos):
+            self.agents.append( self._spawn_agent("blue", position) )
+
+        self.flags.append( Flag("red", flag_red_pos) )
+        for position in _spawn_points("red", flag_red_pos):
+            self.agents.append( self._spawn_agent("red", position) )
+
+    def load_corpus_map(self, corpus, map_id):
+        """Loads a map from a map_corpus.MapCorpus instead of generating one."""
+        if (corpus.width, corpus.height) != (self.width, self.height):
+            raise ValueError(f"Corpus maps are {corpus.width}x{corpus.height}, the world is {self.width}x{self.height}")
+        self.load_map(*corpus.load(map_id))
+
+    def _build_terrain(self):
+        self.terrain = bytearray("".join("".join(row) for row in self.worldmap), "ascii")
+        self.worldmap_buffer = None
+        self._overlay = {}
+        self._tile_bytes = None
+        self._tile_array = None
+        self._sight = {}
+
+    def is_wall(self, x, y):
+        return self.terrain[y*self.width + x] == _WALL
 
     def buffer_worldmap(self):
-        self.worldmap_buffer = copy.deepcopy(self.worldmap)
-        for obj in self.bullets + self.agents:
-            self.worldmap_buffer[obj.position[1]][obj.position[0]] = obj.ascii_tile
+        # Later objects are drawn over earlier ones: bullets, then agents, then dropped flags
+        overlay = {}
+        for position in self.bullets.positions():
+            overlay[position] = self.bullets.ascii_tile
+        for agent in self.agents:
+            overlay[agent.position] = agent.ascii_tile
         for flag in self.flags:
             if not flag.agent_holding:
-                self.worldmap_buffer[flag.position[1]][flag.position[0]] = flag.ascii_tile
+                overlay[flag.position] = flag.ascii_tile
+
+        if self.worldmap_buffer is None:
+            self.worldmap_buffer = [row[:] for row in self.worldmap]
+            self._overlay = {}
+            self._tile_bytes = None
+            self._tile_array = None
+
+        # Only touch the cells whose occupant changed since the last buffer
+        buffer = self.worldmap_buffer
+        previous = self._overlay
+        for position in previous:
+            if position not in overlay:
+                x, y = position
+                buffer[y][x] = chr(self.terrain[y*self.width + x])
+        for position, tile in overlay.items():
+            if previous.get(position) != tile:
+                buffer[position[1]][position[0]] = tile
+        if self._tile_bytes is not None:
+            self._update_tile_bytes(previous, overlay)
+        self._overlay = overlay
+
+    def tile_array(self):
+        """Returns the buffered map as a NumPy uint8 array of tile codes, padded with unknown tiles.
+
+        The padding is AGENT_VISION_RANGE tiles wide on every side, so the tile
+        at (x, y) is at [y + AGENT_VISION_RANGE, x + AGENT_VISION_RANGE]. The
+        array shares memory with a bytearray that buffer_worldmap keeps up to
+        date from then on. NumPy is only imported here, for agents that ask for
+        array observations.
+        """
+        if self._tile_array is None:
+            import numpy as np
+            pad = AGENT_VISION_RANGE
+            unknown = ASCII_TILES["unknown"]
+            rows = [unknown * (self.width + 2*pad)] * pad
+            rows += [unknown * pad + "".join(row) + unknown * pad for row in self.worldmap_buffer]
+            rows += [unknown * (self.width + 2*pad)] * pad
+            self._tile_bytes = bytearray("".join(rows), "ascii")
+            self._tile_array = np.frombuffer(self._tile_bytes, dtype=np.uint8).reshape(self.height + 2*pad, self.width + 2*pad)
+        return self._tile_array
+
+    def _update_tile_bytes(self, previous, overlay):
+        pad = AGENT_VISION_RANGE
+        stride = self.width + 2*pad
+        tiles = self._tile_bytes
+        for position in previous:
+            if position not in overlay:
+                x, y = position
+                tiles[(y + pad)*stride + x + pad] = self.terrain[y*self.width + x]
+        for position, tile in overlay.items():
+            if previous.get(position) != tile:
+                x, y = position
+                tiles[(y + pad)*stride + x + pad] = ord(tile)
 
     def ascii_display(self):
-        os.system('cls' if os.name == 'nt' else 'clear')
-        print(f"Tick: {self.tick}")
-        print("=="*len(self.worldmap_buffer[0]) + "=\n")
-        for row in self.worldmap_buffer:
-            print(" " + " ".join(row))
+        """Draws the world in the terminal through an AsciiRenderer made on first use."""
+        if self.ascii_renderer is None:
+            self.ascii_renderer = AsciiRenderer()
+        self.ascii_renderer.render(self)
+
+    def step(self, actions=None):
+        """Advances the simulation by one tick.
+
+        If actions are given (see update_agents), agents act on them instead of
+        being asked for a decision.
+        """
+        if self.replay is not None:
+            self.replay.record_keyframe(self)
+
+        self.check_win_state()
+        self.buffer_worldmap()
+
+        if self.tick % AGENT_UPDATE_INTERVAL == 0:
+            self.update_agents(actions)
+            if self.stalemate_window:
+                self._check_stalemate()
+        if (self.tick + 1) % BULLET_UPDATE_INTERVAL == 0:
+            self.update_bullets()
+
+        self.iter()
+        if self.skip_idle_ticks and not self.win and self._compute_win_state() is None:
+            self.tick = self.next_event_tick()
+
+    def next_event_tick(self):
+        """Returns the first tick, from the current one on, at which the world can change.
+
+        Agents (and with them healing and resupply) act every AGENT_UPDATE_INTERVAL
+        ticks and bullets move every BULLET_UPDATE_INTERVAL ticks, the rest of the
+        time only the tick counter advances until the timeout at MAX_TICKS.
+        """
+        next_agent_tick = -(-self.tick // AGENT_UPDATE_INTERVAL) * AGENT_UPDATE_INTERVAL
+        next_bullet_tick = -(-(self.tick + 1) // BULLET_UPDATE_INTERVAL) * BULLET_UPDATE_INTERVAL - 1
+        return min(next_agent_tick, next_bullet_tick, max(self.tick, MAX_TICKS))
 
     def iter(self):
         # Sleep to control simulation speed for visualization (GUI or ASCII).
@@ -129,10 +361,61 @@ class World:
             time.sleep(self.tick_rate)
         self.tick += 1
     
-    def update_agents(self):
-        # Agents decide and perform actions
+    def sight(self, position):
+        """Returns (hidden, cells) for an agent at position.
+
+        hidden is the VisibilityTable bitmask of window cells behind walls and
+        cells the world positions the agent sees. Only walls block sight and
+        they never move, so this is worked out once per position from the
+        terrain and shared by every agent that stands there, on every tick.
+        """
+        sight = self._sight.get(position)
+        if sight is None:
+            vision_range = AGENT_VISION_RANGE
+            size = vision_range*2 + 1
+            x_min, y_min = position[0] - vision_range, position[1] - vision_range
+            inside = [(i, x_min + i % size, y_min + i // size) for i in range(size*size)]
+            inside = [(i, x, y) for i, x, y in inside if 0 <= x < self.width and 0 <= y < self.height]
+
+            walls = [i for i, x, y in inside if self.terrain[y*self.width + x] == _WALL]
+            hidden = get_visibility_table(vision_range).hidden_cells(walls)
+            sight = self._sight[position] = (hidden, tuple((x, y) for i, x, y in inside if not hidden >> i & 1))
+        return sight
+
+    def _update_team_map(self, color):
+        # One pass over the union of what the team's agents see, so tiles that
+        # several of them see are copied once. Tiles nobody sees right now keep
+        # whatever was last seen there.
+        knowledge = self.blue_shared_knowledge if color == "blue" else self.red_shared_knowledge
+        team_map = knowledge.get("team_map")
+        if team_map is None:
+            team_map = knowledge["team_map"] = [[ASCII_TILES["unknown"]] * self.width for _ in range(self.height)]
+
+        visible = set()
         for agent in self.agents:
-            agent.control(self)
+            if agent.color == color:
+                visible.update(self.sight(agent.position)[1])
+        buffer = self.worldmap_buffer
+        for x, y in visible:
+            team_map[y][x] = buffer[y][x]
+        knowledge["team_visible"] = visible
+
+    def update_agents(self, actions=None):
+        # Teams that asked for it get their shared map of everything seen so far
+        for color in self._team_map_teams:
+            self._update_team_map(color)
+
+        # Agents perform the given (color, index) -> (action, direction), those
+        # without one decide for themselves, and agents without code stand still
+        for agent in self.agents:
+            key = (agent.color, agent.index)
+            if actions is None or (key not in actions and agent.agent is not None):
+                action, direction = agent.control(self)
+            else:
+                action, direction = actions.get(key, ("", None))
+                agent.apply_action(self, action, direction)
+            if self.replay is not None:
+                self.replay.record_action(self.tick, agent, action, direction)
         
         # Agents handle collisions with walls/flags and update their cooldowns
         for agent in self.agents:
@@ -152,13 +435,13 @@ class World:
                 del self.agents[i]
     
     def update_bullets(self):
-        for i in range(len(self.bullets)-1, -1, -1):
-            hit = self.bullets[i].update(self.worldmap_buffer, self.agents)
-            if hit:
-                del self.bullets[i]
+        self.bullets.update(self, self.agents)
     
     def check_win_state(self):
         if self.win: return
+        self.win = self._compute_win_state()
+
+    def _compute_win_state(self):
         blue_count = 0
         red_count = 0
         for agent in self.agents:
@@ -168,18 +451,149 @@ class World:
                 red_count += 1
         
         if blue_count == 0 and red_count == 0:
-            self.win = ("tied", "mutual_elimination")
+            return ("tied", "mutual_elimination")
         elif red_count == 0:
-            self.win = ("blue", "elimination")
+            return ("blue", "elimination")
         elif blue_count == 0:
-            self.win = ("red", "elimination")
+            return ("red", "elimination")
         elif self.tick >= MAX_TICKS:
-            self.win = ("tied", "timeout")
+            return ("tied", "timeout")
+        elif self.stalemate:
+            return ("tied", "stalemate")
+        return None
+
+    def _check_stalemate(self):
+        """Notices when a match can no longer be decided, after an agent update.
+
+        Progress is any change in the agents' HP (damage, deaths, healing) or in
+        the flags' positions and holders, and an agent reaching a position no
+        agent has stood on before. Without progress for stalemate_window
+        ticks, or when the exact dynamic state (everything snapshot() stores but
+        the tick) comes back stalemate_cycle_repeats times in between, the
+        match is tied with the reason "stalemate" at the next tick.
+        """
+        progress = (
+            tuple((agent.color, agent.index, agent.hp) for agent in self.agents),
+            tuple((flag.position, flag.agent_holding is not None) for flag in self.flags),
+        )
+        visited = len(self._visited)
+        self._visited.update(agent.position for agent in self.agents)
+        if progress != self._progress or len(self._visited) > visited:
+            self._progress = progress
+            self._progress_tick = self.tick
+            self._states_seen.clear()
+            return
+        if self.tick - self._progress_tick >= self.stalemate_window:
+            self.stalemate = True
+            return
+
+        # The tick is the first field of the snapshot header
+        state = self.snapshot()[4:]
+        seen = self._states_seen.get(state, 0) + 1
+        self._states_seen[state] = seen
+        if seen >= self.stalemate_cycle_repeats:
+            self.stalemate = True
     
     def terminate_agents(self):
         for agent in self.agents:
             agent.terminate(reason = self.win[0])
 
+    def snapshot(self):
+        """Packs the dynamic state of the world (everything but the terrain) into bytes, see pack_state."""
+        slots = {agent: slot for slot, agent in enumerate(self.agents)}
+        bullets = self.bullets
+        return pack_state((
+            self.tick,
+            self.win,
+            [(agent.color, agent.index, agent.position, agent.prev_position,
+              agent.hp, agent.ammo, agent.can_shoot, agent.can_shoot_countdown) for agent in self.agents],
+            [(flag.position, slots[flag.agent_holding] if flag.agent_holding else None) for flag in self.flags],
+            [(bullets.color[i], (bullets.x[i], bullets.y[i]), (bullets.dx[i], bullets.dy[i])) for i in range(len(bullets))],
+        ))
+
+    def restore(self, state):
+        """Puts the world back into a state returned by snapshot() on this world."""
+        self.tick, self.win, agents, flags, bullets = _unpack_records(state)
+
+        self.agents = []
+        for red, index, x, y, prev_x, prev_y, hp, ammo, can_shoot, countdown in agents:
+            color = "red" if red else "blue"
+            agent = self._agent_engines[(color, index)]
+            agent.position = (x, y)
+            agent.prev_position = (prev_x, prev_y)
+            agent.hp = hp
+            agent.ammo = ammo
+            agent.can_shoot = bool(can_shoot)
+            agent.can_shoot_countdown = countdown
+            agent.holding_flag = None
+            agent.ascii_tile = ASCII_TILES[f"{color}_agent"]
+            self.agents.append(agent)
+
+        for flag, (x, y, holder) in zip(self.flags, flags):
+            flag.position = (x, y)
+            flag.agent_holding = None
+            if holder != _NO_HOLDER:
+                agent = self.agents[holder]
+                flag.agent_holding = agent
+                agent.holding_flag = flag
+                agent.ascii_tile = ASCII_TILES[f"{agent.color}_agent_f"]
+
+        self.bullets = Bullets()
+        for x, y, dx, dy, red in bullets:
+            self.bullets.spawn("red" if red else "blue", (x, y), (dx, dy))
+
+
+    def stalemate_snapshot(self):
+        """Packs what _check_stalemate remembers of the match so far into bytes.
+
+        snapshot() only holds the current state, so a world restored from it
+        alone would notice a stalemate later than the original match did.
+        """
+        agents, flags = self._progress if self._progress is not None else ((), ())
+        data = [_STALEMATE_HEADER.pack(
+            self._progress_tick, self.stalemate, len(agents) if self._progress is not None else _NO_PROGRESS,
+            len(flags), len(self._visited), len(self._states_seen)
+        )]
+        for color, index, hp in agents:
+            data.append(_PROGRESS_AGENT.pack(color == "red", index, hp))
+        for position, held in flags:
+            data.append(_PROGRESS_FLAG.pack(*position, held))
+        for position in self._visited:
+            data.append(_VISITED.pack(*position))
+        for state, seen in self._states_seen.items():
+            data.append(_STATE_SEEN.pack(len(state), seen))
+            data.append(state)
+        return b"".join(data)
+
+    def stalemate_restore(self, data):
+        """Puts back what stalemate_snapshot() packed, after restore() of the snapshot taken with it."""
+        self._progress_tick, stalemate, agent_count, flag_count, visited_count, seen_count = _STALEMATE_HEADER.unpack_from(data)
+        self.stalemate = bool(stalemate)
+        offset = _STALEMATE_HEADER.size
+
+        agents = []
+        for _ in range(agent_count if agent_count != _NO_PROGRESS else 0):
+            red, index, hp = _PROGRESS_AGENT.unpack_from(data, offset)
+            offset += _PROGRESS_AGENT.size
+            agents.append(("red" if red else "blue", index, hp))
+        flags = []
+        for _ in range(flag_count):
+            x, y, held = _PROGRESS_FLAG.unpack_from(data, offset)
+            offset += _PROGRESS_FLAG.size
+            flags.append(((x, y), bool(held)))
+        self._progress = (tuple(agents), tuple(flags)) if agent_count != _NO_PROGRESS else None
+
+        end = offset + visited_count*_VISITED.size
+        self._visited = set(_VISITED.iter_unpack(data[offset:end]))
+        offset = end
+
+        self._states_seen = {}
+        for _ in range(seen_count):
+            length, seen = _STATE_SEEN.unpack_from(data, offset)
+            offset += _STATE_SEEN.size
+            self._states_seen[data[offset:offset+length]] = seen
+            offset += length
+
 
 class Flag:
     def __init__(self, color, position):
@@ -195,57 +609,69 @@ class Flag:
             self.ascii_tile = ASCII_TILES["red_flag"]
 
 
-class Bullet:
-    def __init__(self, agent, direction):
-        self.color = agent.color
-        self.direction = direction
-        self.position = agent.position
-        self.ascii_tile = ASCII_TILES["bullet"]
-    
-    def update(self, worldmap_buffer, agents):
-        # Move the bullet one step
-        self.position = (self.position[0] + self.direction[0], self.position[1] + self.direction[1])
-        
-        hit_confirmed = False
-        # Check for collision with any enemy agents at the new position
+class Bullets:
+    """Every bullet in flight, stored as parallel lists indexed by bullet."""
+
+    ascii_tile = ASCII_TILES["bullet"]
+
+    def __init__(self):
+        self.x = []
+        self.y = []
+        self.dx = []
+        self.dy = []
+        self.color = []
+
+    def __len__(self):
+        return len(self.x)
+
+    def spawn(self, color, position, direction):
+        self.x.append(position[0])
+        self.y.append(position[1])
+        self.dx.append(direction[0])
+        self.dy.append(direction[1])
+        self.color.append(color)
+
+    def positions(self):
+        return zip(self.x, self.y)
+
+    def update(self, world, agents):
+        """Moves every bullet one step, damaging enemies and dropping bullets that hit something."""
+        # Index agents by tile once, instead of scanning all of them for every bullet
+        agents_at = {}
         for agent in agents:
-            if agent.position == self.position and agent.color != self.color:
-                agent.take_damage(1)
-                hit_confirmed = True
-                
-        # Check for collision with a wall
-        tile = worldmap_buffer[self.position[1]][self.position[0]]
-        if tile == ASCII_TILES["wall"]:
-            return True # Hit a wall, bullet is destroyed
-            
-        return hit_confirmed # Destroy bullet if it hit any agent(s)
-
-def _bresenham_line(x1, y1, x2, y2):
-    """Yields coordinates of tiles between two locations (line of sight)."""
-    dx = abs(x2 - x1)
-    dy = abs(y2 - y1)
-    sx = 1 if x1 <= x2 else -1
-    sy = 1 if y1 <= y2 else -1
-    err = dx - dy
-
-    while x1 != x2 or y1 != y2:
-        yield x1, y1
-        e2 = err * 2
-        
-        if e2 > -dy:
-            err -= dy
-            x1 += sx
-            
-        if e2 < dx:
-            err += dx
-            y1 += sy
+            agents_at.setdefault(agent.position, []).append(agent)
+
+        terrain = world.terrain
+        width = world.width
+        xs, ys, dxs, dys, colors = self.x, self.y, self.dx, self.dy, self.color
+        kept = 0
+        for i in range(len(xs)):
+            x = xs[i] + dxs[i]
+            y = ys[i] + dys[i]
+            color = colors[i]
+
+            # A bullet damages every enemy agent on the tile it enters
+            hit_confirmed = False
+            for agent in agents_at.get((x, y), ()):
+                if agent.color != color:
+                    agent.take_damage(1)
+                    hit_confirmed = True
+
+            # Destroy the bullet if it hit any agent(s) or a wall
+            if hit_confirmed or terrain[y*width + x] == _WALL:
+                continue
+
+            xs[kept], ys[kept], dxs[kept], dys[kept], colors[kept] = x, y, dxs[i], dys[i], color
+            kept += 1
+
+        for column in (xs, ys, dxs, dys, colors):
+            del column[kept:]
 
 class AgentEngine:
-    blue_index = 0
-    red_index = 0
 
-    def __init__(self, color, position, agent_class):
+    def __init__(self, color, position, agent_class, index, output=None):
         self.color = color
+        self.index = index
         self.position = position
         self.prev_position = self.position
         
@@ -258,20 +684,28 @@ class AgentEngine:
         self.holding_flag = None
 
         if self.color == "blue":
-            self.index = AgentEngine.blue_index
-            AgentEngine.blue_index += 1
             self.ascii_tile = ASCII_TILES["blue_agent"]
         elif self.color == "red":
-            self.index = AgentEngine.red_index
-            AgentEngine.red_index += 1
             self.ascii_tile = ASCII_TILES["red_agent"]
         
-        self.agent = agent_class(self.color, self.index)
+        # Where the agent's prints go, None leaves stdout alone
+        self.output = output
+
+        # Replays play back without any agent code, their agent class is None
+        self.agent = self._call_agent(agent_class, self.color, self.index) if agent_class else None
+        # Agents that set observation_format = "array" get get_visible_array instead of the tile grid
+        self.array_observations = getattr(self.agent, "observation_format", "grid") == "array"
             
+    def _call_agent(self, func, *args):
+        if self.output is None:
+            return func(*args)
+        return call_with_output(self.output, func, *args)
+
     def terminate(self, reason):
         if self.holding_flag:
             self.holding_flag.agent_holding = None
-        self.agent.terminate(reason)
+        if self.agent:
+            self._call_agent(self.agent.terminate, reason)
     
     def take_damage(self, amount):
         """Reduces the agent's health. If holding a flag, drops it."""
@@ -306,26 +740,46 @@ class AgentEngine:
                 self.ammo += 1
 
     def get_visible_world(self, world):
+        vision_range = AGENT_VISION_RANGE
+        x_min = self.position[0] - vision_range
+        x_max = self.position[0] + vision_range
+        unknown = ASCII_TILES["unknown"]
+
         visible_world = []
-        
-        for y in range(0, AGENT_VISION_RANGE*2+1):
-            y_world = self.position[1] + y - AGENT_VISION_RANGE
-            visible_world.append([])
-            for x in range(0, AGENT_VISION_RANGE*2+1):
-                x_world = self.position[0] + x - AGENT_VISION_RANGE
-                if 0 <= x_world < world.width and 0 <= y_world < world.height:
-                    visible_world[-1].append(world.worldmap_buffer[y_world][x_world])
-                else:
-                    visible_world[-1].append(ASCII_TILES["unknown"])
-                    
-        agent_x, agent_y = AGENT_VISION_RANGE, AGENT_VISION_RANGE
-        for y in range(len(visible_world)):
-            for x in range(len(visible_world[0])):
-                for x_online, y_online in _bresenham_line(agent_x, agent_y, x, y):
-                    if visible_world[y_online][x_online] == ASCII_TILES["wall"]:
-                        visible_world[y][x] = ASCII_TILES["unknown"]
-                        break
-        return visible_world
+        for y_world in range(self.position[1] - vision_range, self.position[1] + vision_range + 1):
+            if not 0 <= y_world < world.height:
+                visible_world.append([unknown] * (vision_range*2+1))
+                continue
+            row = world.worldmap_buffer[y_world]
+            if x_min >= 0 and x_max < world.width:
+                visible_world.append(row[x_min:x_max+1])
+            else:
+                visible_world.append([row[x_world] if 0 <= x_world < world.width else unknown for x_world in range(x_min, x_max+1)])
+
+        # Blank out everything behind walls
+        return get_visibility_table(vision_range).hide(visible_world, world.sight(self.position)[0])
+
+    def get_visible_array(self, world):
+        """Returns the visible window as a read-only uint8 array of tile codes, and its top left corner.
+
+        The same tiles as get_visible_world, without building lists: when no
+        wall hides anything the window is a view into World.tile_array, only
+        valid until the world changes. The corner (x, y) is in world coordinates
+        and is negative for windows reaching over the top or left map edge.
+        """
+        import numpy as np
+        vision_range = AGENT_VISION_RANGE
+        size = vision_range*2 + 1
+        x, y = self.position
+        window = world.tile_array()[y:y+size, x:x+size]
+
+        hidden = world.sight(self.position)[0]
+        if hidden:
+            bits = np.frombuffer(hidden.to_bytes((size*size + 7) // 8, "little"), dtype=np.uint8)
+            mask = np.unpackbits(bits, count=size*size, bitorder="little").reshape(size, size).view(bool)
+            window = np.where(mask, np.uint8(ord(ASCII_TILES["unknown"])), window)
+        window.flags.writeable = False
+        return window, (x - vision_range, y - vision_range)
     
     def _handle_movement(self, direction):
         self.prev_position = self.position
@@ -338,19 +792,27 @@ class AgentEngine:
         self.can_shoot_countdown = SHOOT_COOLDOWN
 
     def _handle_shooting(self, world, direction):
-        if   direction == "right": world.bullets.append( Bullet(self, direction=(1, 0)) )
-        elif direction == "left":  world.bullets.append( Bullet(self, direction=(-1, 0)) )
-        elif direction == "up":    world.bullets.append( Bullet(self, direction=(0, -1)) )
-        elif direction == "down":  world.bullets.append( Bullet(self, direction=(0, 1)) )
+        if   direction == "right": world.bullets.spawn(self.color, self.position, (1, 0))
+        elif direction == "left":  world.bullets.spawn(self.color, self.position, (-1, 0))
+        elif direction == "up":    world.bullets.spawn(self.color, self.position, (0, -1))
+        elif direction == "down":  world.bullets.spawn(self.color, self.position, (0, 1))
         self.ammo -= 1
         self.can_shoot = False
         self.can_shoot_countdown = SHOOT_COOLDOWN
 
     def control(self, world):
         knowledge_base = world.blue_shared_knowledge if self.color == "blue" else world.red_shared_knowledge
-        
-        action, direction = self.agent.update(
-            self.get_visible_world(world),
+        if self.array_observations:
+            visible_world = self.get_visible_array(world)
+        else:
+            visible_world = self.get_visible_world(world)
+
+        profiler = world.profiler
+        if profiler is not None:
+            started = profiler.begin()
+        action, direction = self._call_agent(
+            self.agent.update,
+            visible_world,
             self.position,
             self.can_shoot,
             self.holding_flag,
@@ -358,7 +820,12 @@ class AgentEngine:
             self.hp,
             self.ammo
         )
+        if profiler is not None:
+            profiler.end(self, started)
+        self.apply_action(world, action, direction)
+        return action, direction
 
+    def apply_action(self, world, action, direction):
         if action == "move":
             self._handle_movement(direction)
         elif action == "shoot" and self.can_shoot and self.ammo > 0:
@@ -366,7 +833,7 @@ class AgentEngine:
 
     def _check_wall_collision(self, world):
         x, y = self.position
-        if world.worldmap[y][x] == ASCII_TILES["wall"]:
+        if world.is_wall(x, y):
             self.position = self.prev_position
             return True
         return False
@@ -404,4 +871,117 @@ class AgentEngine:
         if not self.can_shoot and self.can_shoot_countdown > 0:
             self.can_shoot_countdown -= 1
         else:
-            self.can_shoot = True
\ No newline at end of file
+            self.can_shoot = True
+
+
+MatchResult = collections.namedtuple("MatchResult", [
+    "blue", "red", "seed", "winner", "reason", "ticks",
+    "timings", # {"setup": seconds loading agents and building the map, "match": seconds playing}
+    "report", # profiling report with --profile, else None
+    "team_stats", # {color: AgentProcessTeam.stats()} when isolated, else None
+    "agent_logs", # AgentLogCapture with agent_output="capture", else None
+])
+
+def run_match(blue, red, seed=None, headless=True, ascii=False, fps=None, tick_rate=None, agent_output=None,
+              time_budget=None, profile=False, trace_memory=False, record=None, maps=None, map_id=0, stalemate_window=None,
+              names=None):
+    """Plays one match between two teams and returns its MatchResult.
+
+    blue and red are team folders (or Agent classes, reported under names,
+    a (blue, red) tuple, or else their class names). Without a GUI or ASCII
+    display the match runs as fast as possible, skipping idle ticks; pygame is
+    only imported when headless is False. With a time budget (in seconds)
+    each team runs in its own process and slower updates are skipped. record
+    is a file to save a replay to, maps a map corpus file to play map_id of.
+    With a stalemate window (in ticks) dead matches are tied early. A match
+    stopped by closing the GUI window ends ("tied", "aborted").
+    Agent output is shown, or captured with an ASCII display, which it would
+    scroll away; with ascii and agent_output="show" every frame is redrawn.
+    The global random module is seeded with seed, as agents draw from it;
+    without one a seed is drawn, so the returned seed reproduces the match.
+    Nothing is printed or logged, that is up to the caller.
+    """
+    started = time.perf_counter()
+    if agent_output is None:
+        agent_output = "capture" if ascii else "show"
+    if seed is None:
+        seed = random.randrange(2**32)
+    blue_name, red_name = names or (team if isinstance(team, str) else team.__name__ for team in (blue, red))
+
+    teams = []
+    if time_budget is not None:
+        if time_budget <= 0:
+            raise ValueError(f"time_budget must be positive, not {time_budget}")
+        from agent_process import AgentProcessTeam
+        for team in (blue, red):
+            teams.append(AgentProcessTeam(team, time_budget, seed, quiet=agent_output == "discard"))
+        blue_agent_class, red_agent_class = (team.create_agent for team in teams)
+    else:
+        blue_agent_class, red_agent_class = (load_agent_class(team) if isinstance(team, str) else team for team in (blue, red))
+
+    try:
+        renderer = None
+        if not headless:
+            from renderer import Renderer, handle_pygame_events
+            renderer = Renderer(WIDTH, HEIGHT)
+
+        random.seed(seed)
+        live = not headless or ascii
+        world = World(HEIGHT, WIDTH, TICK_RATE if tick_rate is None else tick_rate, blue_agent_class, red_agent_class,
+                      headless=headless, ascii_mode=ascii, seed=seed, skip_idle_ticks=not live, agent_output=agent_output,
+                      stalemate_window=stalemate_window)
+        if maps:
+            from map_corpus import open_corpus
+            world.load_corpus_map(open_corpus(maps), map_id)
+        else:
+            world.generate_world()
+        if record:
+            from replay import ReplayRecorder
+            world.replay = ReplayRecorder(world, blue_name, red_name)
+        if ascii:
+            # Isolated teams print from their own processes unless their output is discarded
+            prints = agent_output == "show" or (time_budget is not None and agent_output != "discard")
+            world.ascii_renderer = AsciiRenderer(ASCII_FPS if fps is None else fps, full_redraw=prints)
+        if profile or trace_memory:
+            from profiling import MatchProfiler
+            world.profiler = MatchProfiler(trace_memory=trace_memory)
+
+        playing = time.perf_counter()
+        try:
+            while not world.win:
+                world.step()
+                if ascii:
+                    world.ascii_display()
+                if renderer:
+                    renderer.render(world)
+                    if not handle_pygame_events():
+                        # Closing the window stops the match without a result
+                        world.win = ("tied", "aborted")
+        finally:
+            if ascii:
+                world.ascii_renderer.close()
+            if renderer:
+                renderer.close()
+        finished = time.perf_counter()
+        world.terminate_agents()
+    finally:
+        for team in teams:
+            team.close()
+
+    if world.replay:
+        world.replay.finish(world)
+        world.replay.save(record)
+
+    winner, reason = world.win
+    return MatchResult(
+        blue=blue_name,
+        red=red_name,
+        seed=world.seed,
+        winner=winner,
+        reason=reason,
+        ticks=world.tick,
+        timings={"setup": playing - started, "match": finished - playing},
+        report=world.profiler.report(world, blue_name, red_name) if world.profiler else None,
+        team_stats={color: team.stats() for color, team in zip(("blue", "red"), teams)} if teams else None,
+        agent_logs=world.agent_logs if agent_output == "capture" else None,
+    )
@@ -0,0 +1,155 @@
+"""Batched environment for training learning agents on many worlds at once.
+
+VecEnv runs num_envs headless worlds in one process. One team's agents are
+driven by the actions passed to step(), the other team is played by an
+opponent Agent class (or stands still). Every step advances all worlds to
+their next agent update and returns NumPy arrays for the whole batch:
+
+    observations["view"]      (num_envs, agents, len(CHANNELS), 9, 9) uint8,
+                              the agent's visible window, one 0/1 plane per
+                              channel, "team"/"enemy" relative to the trained team
+    observations["status"]    (num_envs, agents, len(STATUS)) int16
+    observations["position"]  (num_envs, agents, 2) int16, x and y
+    rewards                   (num_envs,) float32, +1 for a win and -1 for a
+                              loss on the last step of a match, otherwise 0
+    dones                     (num_envs,) bool
+
+A world whose match ended is replaced by a new one straight away, so the
+observations returned for it already belong to the next match; infos holds
+the result of the finished one. Requires NumPy, which the game itself doesn't.
+
+    env = VecEnv(64, opponent_class=load_agent_class("other_team"))
+    observations = env.reset()
+    observations, rewards, dones, infos = env.step(actions) # actions: (64, 3) ints
+"""
+
+import numpy as np
+from tournament import World
+from map_corpus import open_corpus
+from config import *
+
+# Action codes, index into this list
+ACTIONS = [("", None)] + [(action, direction) for action in ("move", "shoot") for direction in ("left", "right", "up", "down")]
+
+CHANNELS = ["wall", "unknown", "team_agent", "enemy_agent", "team_agent_with_flag", "enemy_agent_with_flag",
+            "team_flag", "enemy_flag", "bullet"]
+STATUS = ["alive", "hp", "ammo", "can_shoot", "holding_flag"]
+
+def _channel_table(team):
+    """Maps every tile character to its row of channel planes, from the point of view of team."""
+    enemy = "red" if team == "blue" else "blue"
+    tiles = {
+        "wall": ASCII_TILES["wall"],
+        "unknown": ASCII_TILES["unknown"],
+        "team_agent": ASCII_TILES[f"{team}_agent"],
+        "enemy_agent": ASCII_TILES[f"{enemy}_agent"],
+        "team_agent_with_flag": ASCII_TILES[f"{team}_agent_f"],
+        "enemy_agent_with_flag": ASCII_TILES[f"{enemy}_agent_f"],
+        "team_flag": ASCII_TILES[f"{team}_flag"],
+        "enemy_flag": ASCII_TILES[f"{enemy}_flag"],
+        "bullet": ASCII_TILES["bullet"],
+    }
+    table = np.zeros((256, len(CHANNELS)), dtype=np.uint8)
+    for channel, name in enumerate(CHANNELS):
+        table[ord(tiles[name]), channel] = 1
+    return table
+
+
+class VecEnv:
+    """num_envs worlds stepped together, with team's agents controlled through step()."""
+
+    def __init__(self, num_envs, team="blue", opponent_class=None, seed=0, maps=None, height=HEIGHT, width=WIDTH):
+        self.num_envs = num_envs
+        self.team = team
+        self.opponent_class = opponent_class
+        self.height = height
+        self.width = width
+        # Optional map corpus file, match seeds then pick the map id
+        self.corpus = open_corpus(maps) if maps else None
+
+        self.next_seed = seed
+        self.worlds = [None] * num_envs
+        self.channel_table = _channel_table(team)
+        self.window_size = AGENT_VISION_RANGE*2 + 1
+        self.agents_per_team = None
+
+    def _new_world(self):
+        seed = self.next_seed
+        self.next_seed += 1
+        blue_class, red_class = (None, self.opponent_class) if self.team == "blue" else (self.opponent_class, None)
+        world = World(self.height, self.width, 0, blue_class, red_class, headless=True, seed=seed, skip_idle_ticks=True,
+                      agent_output="discard")
+        if self.corpus:
+            world.load_corpus_map(self.corpus, seed % len(self.corpus))
+        else:
+            world.generate_world()
+        if self.agents_per_team is None:
+            self.agents_per_team = world.agent_counts[self.team]
+        return world
+
+    def reset(self):
+        """Starts a new match in every world and returns the first observations."""
+        self.close()
+        self.worlds = [self._new_world() for _ in range(self.num_envs)]
+        return self._observe()
+
+    def _abandon(self, world):
+        # Opponent agents are told the match ended in a tie
+        world.win = ("tied", "aborted")
+        world.terminate_agents()
+
+    def step(self, actions):
+        """Performs one agent update with the given (num_envs, agents) action codes in every world.
+
+        Returns (observations, rewards, dones, infos), where infos holds a dict
+        per world with the "win" tuple and "ticks" of a match that just ended.
+        """
+        actions = np.asarray(actions)
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        dones = np.zeros(self.num_envs, dtype=bool)
+        infos = [{} for _ in range(self.num_envs)]
+
+        for env, world in enumerate(self.worlds):
+            world.step({(self.team, index): ACTIONS[code] for index, code in enumerate(actions[env].tolist())})
+            # Run the ticks in between (bullets) up to the next agent update
+            while not world.win and world.tick % AGENT_UPDATE_INTERVAL:
+                world.step()
+            world.check_win_state()
+
+            if world.win:
+                winner, _ = world.win
+                rewards[env] = 0 if winner == "tied" else (1 if winner == self.team else -1)
+                dones[env] = True
+                infos[env] = {"win": world.win, "ticks": world.tick}
+                world.terminate_agents()
+                self.worlds[env] = self._new_world()
+
+        return self._observe(), rewards, dones, infos
+
+    def _observe(self):
+        agents = self.agents_per_team
+        size = self.window_size
+        tiles = np.full((self.num_envs, agents, size*size), ord(ASCII_TILES["unknown"]), dtype=np.uint8)
+        status = np.zeros((self.num_envs, agents, len(STATUS)), dtype=np.int16)
+        position = np.zeros((self.num_envs, agents, 2), dtype=np.int16)
+
+        for env, world in enumerate(self.worlds):
+            world.buffer_worldmap()
+            for agent in world.agents:
+                if agent.color != self.team:
+                    continue
+                window, _ = agent.get_visible_array(world)
+                tiles[env, agent.index] = window.ravel()
+                status[env, agent.index] = (1, agent.hp, agent.ammo, agent.can_shoot, agent.holding_flag is not None)
+                position[env, agent.index] = agent.position
+
+        # One table lookup turns the tile codes of the whole batch into channel planes
+        view = self.channel_table[tiles].reshape(self.num_envs, agents, size, size, len(CHANNELS)).transpose(0, 1, 4, 2, 3)
+        return {"view": np.ascontiguousarray(view), "status": status, "position": position}
+
+    def close(self):
+        """Ends the matches still running."""
+        for world in self.worlds:
+            if world is not None and not world.win:
+                self._abandon(world)
+        self.worlds = [None] * self.num_envs
@@ -0,0 +1,104 @@
+import functools
+from config import *
+
+def _bresenham_line(x1, y1, x2, y2):
+    """Yields coordinates of tiles between two locations (line of sight)."""
+    dx = abs(x2 - x1)
+    dy = abs(y2 - y1)
+    sx = 1 if x1 <= x2 else -1
+    sy = 1 if y1 <= y2 else -1
+    err = dx - dy
+
+    while x1 != x2 or y1 != y2:
+        yield x1, y1
+        e2 = err * 2
+        
+        if e2 > -dy:
+            err -= dy
+            x1 += sx
+            
+        if e2 < dx:
+            err += dx
+            y1 += sy
+
+
+class VisibilityTable:
+    """Precomputed line-of-sight dependencies for a square vision window.
+
+    Cells of the window are numbered row by row (index = y * size + x) and sets
+    of cells are stored as int bitmasks. For every cell, shadows[i] holds the
+    cells whose Bresenham line from the centre passes through cell i, so a wall
+    at i hides exactly those cells.
+    """
+
+    def __init__(self, vision_range):
+        self.vision_range = vision_range
+        self.size = vision_range * 2 + 1
+        cell_count = self.size * self.size
+
+        self.shadows = [0] * cell_count
+        for y in range(self.size):
+            for x in range(self.size):
+                for x_online, y_online in _bresenham_line(vision_range, vision_range, x, y):
+                    self.shadows[y_online * self.size + x_online] |= 1 << (y * self.size + x)
+
+        # Cells that come before cell i in row-major order
+        self.earlier = [(1 << i) - 1 for i in range(cell_count)]
+
+    def hidden_cells(self, walls):
+        """Returns the bitmask of cells hidden by walls at the given ascending cell indices.
+
+        Matches resolving the window cell by cell in row-major order, where a
+        cell is hidden if a wall lies on its line and hidden walls are
+        overwritten with the unknown tile (so they stop blocking later cells).
+        """
+        if not walls:
+            return 0
+
+        # later[k]: cells shadowed by the walls after walls[k], still walls when walls[k] is resolved
+        later = [0] * len(walls)
+        acc = 0
+        for k in range(len(walls) - 1, -1, -1):
+            later[k] = acc
+            acc |= self.shadows[walls[k]]
+
+        hidden = 0
+        visible_shadows = 0
+        for k, i in enumerate(walls):
+            # Every wall blocks the cells resolved before it, visible ones block all of their shadow
+            hidden |= self.shadows[i] & self.earlier[i]
+            if not (visible_shadows | later[k]) >> i & 1:
+                visible_shadows |= self.shadows[i]
+        return hidden | visible_shadows
+
+    def apply(self, window):
+        """Replaces every cell of a size x size window hidden behind a wall with the unknown tile."""
+        wall = ASCII_TILES["wall"]
+        walls = []
+        for y, row in enumerate(window):
+            if wall in row:
+                base = y * self.size
+                walls.extend(base + x for x, tile in enumerate(row) if tile == wall)
+
+        return self.hide(window, self.hidden_cells(walls))
+
+    def hide(self, window, hidden):
+        """Replaces the cells of a size x size window in the hidden bitmask with the unknown tile."""
+        if not hidden:
+            return window
+
+        unknown = ASCII_TILES["unknown"]
+        full_row = (1 << self.size) - 1
+        for y in range(self.size):
+            row_hidden = hidden >> (y * self.size) & full_row
+            if row_hidden == full_row:
+                window[y] = [unknown] * self.size
+            elif row_hidden:
+                window[y] = [unknown if row_hidden >> x & 1 else tile for x, tile in enumerate(window[y])]
+        return window
+
+
+@functools.lru_cache(maxsize=None)
+def get_visibility_table(vision_range):
+    """Returns the shared VisibilityTable for a vision range, building it on first use."""
+    return VisibilityTable(vision_range)